@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BACKFILL_WORKERS = 4
+
+# Titles match the achievements table in backend/ecometer.db. criteria is
+# a key of document_metrics; a badge is earned at >= value and kept.
+ACHIEVEMENT_RULES = [
+    {"icon": "🎉", "title": "First Step", "desc": "Upload your first electricity bill", "criteria": "months_tracked", "value": 1},
+    {"icon": "🌿", "title": "Green Warrior", "desc": "EcoScore above 95", "criteria": "eco_score", "value": 95},
+    {"icon": "🏆", "title": "Eco Champion", "desc": "EcoScore above 90", "criteria": "eco_score", "value": 90},
+    {"icon": "🌟", "title": "Energy Star", "desc": "EcoScore above 80", "criteria": "eco_score", "value": 80},
+    {"icon": "📅", "title": "Consistent Tracker", "desc": "3+ months of data", "criteria": "months_tracked", "value": 3},
+    {"icon": "🎯", "title": "Long-term Saver", "desc": "6+ months of tracking", "criteria": "months_tracked", "value": 6},
+]
+
+
+def document_metrics(data):
+    return {
+        "eco_score": data["eco_score"],
+        "months_tracked": len(data["usage_history"])
+    }
+
+
+def event_metrics(data, event):
+    """Metrics as they will be once event is applied to data."""
+    months = len(data["usage_history"])
+    if data["usage_history"].get(event["month"]) is None:
+        months += 1
+    return {"eco_score": event["eco_score"], "months_tracked": months}
+
+
+def new_achievements(data, metrics, rules=ACHIEVEMENT_RULES):
+    """Badges the metrics qualify for that data doesn't hold yet."""
+    earned = {badge["title"] for badge in data.get("achievements", [])}
+    earned_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [
+        {"icon": rule["icon"], "title": rule["title"], "desc": rule["desc"], "earned_at": earned_at}
+        for rule in rules
+        if rule["title"] not in earned and metrics[rule["criteria"]] >= rule["value"]
+    ]
+
+
+def _backfill_household(store, name, rules):
+    data = store.load(name)
+    if not data["usage_history"]:
+        return 0
+    badges = new_achievements(data, document_metrics(data), rules)
+    if badges:
+        store.award_achievements(badges, name)
+    return len(badges)
+
+
+def backfill_achievements(store, rules=ACHIEVEMENT_RULES, workers=BACKFILL_WORKERS):
+    """Evaluate rules for every stored household; returns badges awarded."""
+    names = [name for name, _, _, _ in store.iter_profiles()]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ecometer-achievements") as executor:
+        return sum(executor.map(lambda name: _backfill_household(store, name, rules), names))
+
+
+def rules_version(rules=ACHIEVEMENT_RULES):
+    """Checksum of the rules; households only need re-evaluating when it changes."""
+    return zlib.crc32(json.dumps(rules, sort_keys=True).encode("utf-8"))
+
+
+def backfill_if_rules_changed(store, version_file, rules=ACHIEVEMENT_RULES):
+    """Backfill once per rules version, recorded in version_file; returns badges awarded."""
+    version = rules_version(rules)
+    try:
+        with open(version_file, 'r') as f:
+            if int(f.read()) == version:
+                return 0
+    except (FileNotFoundError, ValueError):
+        pass
+
+    awarded = backfill_achievements(store, rules)
+    tmp_file = version_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(str(version))
+    os.replace(tmp_file, version_file)
+    return awarded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Award achievements every household already qualifies for")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    args = parser.parse_args()
+
+    from utils import get_store
+    print(f"Awarded {backfill_achievements(get_store(), workers=args.workers)} achievements")
@@ -1,14 +1,15 @@
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime
+from page_registry import load_times, render_page
+from diagnostics import DIAGNOSTICS_ENABLED, STARTUP_MODULES, profile_imports, slowest_imports, top_level_cost
 from utils import (
     load_user_data, 
-    get_ai_suggestion, 
+    get_suggestions, 
     get_comparison_stats,
     get_monthly_challenge,
-    get_achievements
+    join_monthly_challenge,
+    get_achievements,
+    get_community_average
 )
 
 st.set_page_config(
@@ -239,10 +240,35 @@ with st.sidebar:
     st.markdown("</div>", unsafe_allow_html=True)
     
     st.markdown("---")
+    # Pages pull in pandas/Plotly on first visit; Home never does
+    if DIAGNOSTICS_ENABLED:
+        with st.expander("🩺 Import times"):
+            for page, seconds in load_times.items():
+                st.caption(f"{page} page first load: {seconds * 1000:.0f} ms")
+            if st.button("Profile cold start", key="profile_imports"):
+                try:
+                    rows = profile_imports(STARTUP_MODULES)
+                except RuntimeError as e:
+                    st.error(f"Profiling failed: {e}")
+                else:
+                    st.caption(f"Startup imports: {sum(top_level_cost(rows, STARTUP_MODULES).values()) / 1000:.0f} ms")
+                    st.dataframe(
+                        [{"Module": name, "Self (ms)": self_us / 1000, "Cumulative (ms)": cumulative_us / 1000}
+                         for name, self_us, cumulative_us, _ in slowest_imports(rows)],
+                        use_container_width=True,
+                        hide_index=True
+                    )
+        st.markdown("---")
+    
     st.markdown(f"<p style='text-align: center; color: #4b5248;'>👤 {user_name}</p>", unsafe_allow_html=True)
     st.markdown("<p style='text-align: center; color: #4b5248;'>EcoMeter © 2025</p>", unsafe_allow_html=True)
     st.markdown("<p style='text-align: center; color: #4b5248;'>Built with ❤️ by Hania Haroon</p>", unsafe_allow_html=True)
 
+if st.session_state.page != 'Upload':
+    # Upload results belong to the visit that submitted them
+    st.session_state.pop('image_result', None)
+    st.session_state.pop('manual_result', None)
+
 if st.session_state.page == 'Home':
     st.markdown("<div class='app-header'>⚡ EcoMeter - Community Energy Insights</div>", unsafe_allow_html=True)
     
@@ -296,11 +322,11 @@ if st.session_state.page == 'Home':
                 st.metric("Bill Estimate", f"PKR {bill_estimate:,.0f}")
             
             with col2c:
-                st.metric("Community Average", "300 kWh")
+                st.metric("Community Average", f"{get_community_average(user_data['user']['location']):,} kWh")
             
             # Comparison stats
             if current_usage > 0:
-                comparison = get_comparison_stats(current_usage, user_data["user"]["household_size"])
+                comparison = get_comparison_stats(current_usage, user_data["user"]["household_size"], user_data["user"]["location"])
                 
                 st.markdown("<br>", unsafe_allow_html=True)
                 
@@ -319,7 +345,7 @@ if st.session_state.page == 'Home':
         # AI Suggestions
         st.markdown("<div class='section-header'>💡 AI-Powered Suggestions</div>", unsafe_allow_html=True)
         
-        suggestions = get_ai_suggestion(eco_score, current_usage)
+        suggestions = get_suggestions(user_data)
         
         for i, suggestion in enumerate(suggestions[:3]):  # Show top 3 suggestions
             st.info(suggestion)
@@ -340,13 +366,16 @@ if st.session_state.page == 'Home':
         """, unsafe_allow_html=True)
         
         if st.button("Join Challenge", type="primary"):
-            st.balloons()
-            st.success("🎉 You've joined the challenge! Good luck!")
+            if join_monthly_challenge():
+                st.balloons()
+                st.success("🎉 You've joined the challenge! Good luck!")
+            else:
+                st.info("You're already taking part in this month's challenge.")
         
         st.markdown("---")
         
         # Achievements
-        achievements = get_achievements(eco_score, len(usage_history))
+        achievements = get_achievements(user_data)
         
         if achievements:
             st.markdown("<div class='section-header'>🏆 Your Achievements</div>", unsafe_allow_html=True)
@@ -362,13 +391,10 @@ if st.session_state.page == 'Home':
             st.markdown(achievement_html, unsafe_allow_html=True)
 
 elif st.session_state.page == 'Upload':
-    with open('app_pages/upload_bill.py', 'r', encoding='utf-8') as f:
-        exec(f.read())
+    render_page('Upload')
 
 elif st.session_state.page == 'Stats':
-    with open('app_pages/my_stats.py', 'r', encoding='utf-8') as f:
-        exec(f.read())
+    render_page('Stats')
 
 elif st.session_state.page == 'Leaderboard':
-    with open('app_pages/leaderboard.py', 'r', encoding='utf-8') as f:
-        exec(f.read())
+    render_page('Leaderboard')
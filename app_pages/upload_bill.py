@@ -1,212 +1,291 @@
 import streamlit as st
-import time
 from datetime import datetime
-from utils import add_usage_entry, calculate_eco_score, save_bill_image
+from utils import calculate_eco_score, save_bill_image, get_community_average, load_user_data
+from bill_jobs import submit_bill, get_job, FINAL_STATUSES
+from write_behind import submit_usage, get_write_status
 
-st.markdown("<div class='app-header'>⚡ EcoMeter - Community Energy Insights</div>", unsafe_allow_html=True)
 
-st.markdown("<h1 style='text-align: center;'>📤 Upload Electricity Bill</h1>", unsafe_allow_html=True)
-st.markdown("<p style='text-align: center;'>Upload your electricity bill or enter your usage data manually to track your energy consumption 🌱</p>", unsafe_allow_html=True)
+def show_save_status(ticket, result_key):
+    # Results render straight away; persistence is confirmed here once the
+    # background writer has stored the entry.
+    polling = get_write_status(ticket) == "pending"
+    if not polling:
+        # This run (the submit, or the rerun that ended polling) shows the
+        # result for the last time
+        st.session_state.pop(result_key, None)
 
-st.markdown("---")
+    @st.fragment(run_every=1 if polling else None)
+    def save_status():
+        status = get_write_status(ticket)
+        if status == "saved":
+            st.caption("💾 Saved to your history")
+        elif status == "failed":
+            st.error("🚨 We couldn't save this entry. Please try again.")
+        elif status == "pending":
+            st.caption("⏳ Saving to your history...")
 
-tab1, tab2 = st.tabs(["📄 Upload Bill Image", "⌨️ Manual Entry"])
+        if polling and status != "pending":
+            st.rerun()
+    
+    save_status()
+
+
+def render():
+    """Upload a bill image or enter usage by hand."""
+    st.markdown("<div class='app-header'>⚡ EcoMeter - Community Energy Insights</div>", unsafe_allow_html=True)
+
+    st.markdown("<h1 style='text-align: center;'>📤 Upload Electricity Bill</h1>", unsafe_allow_html=True)
+    st.markdown("<p style='text-align: center;'>Upload your electricity bill or enter your usage data manually to track your energy consumption 🌱</p>", unsafe_allow_html=True)
+
+    st.markdown("---")
 
-with tab1:
-    st.markdown("<h3 style='color: #03A9F4; text-align: center;'>Upload Your Bill</h3>", unsafe_allow_html=True)
-    st.markdown("<p style='color: #263238; text-align: center;'>Take a photo or scan your electricity bill and upload it here.</p>", unsafe_allow_html=True)
+    tab1, tab2 = st.tabs(["📄 Upload Bill Image", "⌨️ Manual Entry"])
+
+    with tab1:
+        st.markdown("<h3 style='color: #03A9F4; text-align: center;'>Upload Your Bill</h3>", unsafe_allow_html=True)
+        st.markdown("<p style='color: #263238; text-align: center;'>Take a photo or scan your electricity bill and upload it here.</p>", unsafe_allow_html=True)
     
-    uploaded_file = st.file_uploader(
-        "Choose your bill file", 
-        type=["jpg", "jpeg", "png", "pdf"],
-        help="Supported formats: JPG, PNG, PDF"
-    )
+        uploaded_file = st.file_uploader(
+            "Choose your bill file", 
+            type=["jpg", "jpeg", "png", "pdf"],
+            help="Supported formats: JPG, PNG, PDF"
+        )
     
-    if uploaded_file:
-        st.success("✅ Bill uploaded successfully!")
+        if uploaded_file:
+            st.success("✅ Bill uploaded successfully!")
+        
+            if uploaded_file.type.startswith('image'):
+                st.image(uploaded_file, caption="Uploaded Bill Preview", use_column_width=True)
+            else:
+                st.info("📄 PDF file uploaded. Preview not available.")
         
-        if uploaded_file.type.startswith('image'):
-            st.image(uploaded_file, caption="Uploaded Bill Preview", use_column_width=True)
-        else:
-            st.info("📄 PDF file uploaded. Preview not available.")
+            st.markdown("---")
         
-        st.markdown("---")
-        st.info("💡 **Coming Soon:** OCR (Optical Character Recognition) will automatically extract usage data from your bill!")
+            # Extraction runs on the background job queue; this page only polls it
+            upload_key = f"{uploaded_file.name}-{uploaded_file.size}"
+            bill_jobs = st.session_state.setdefault('bill_jobs', {})
+            if upload_key not in bill_jobs:
+                bill_jobs[upload_key] = submit_bill(save_bill_image(uploaded_file))
+            job_id = bill_jobs[upload_key]
         
-        st.markdown("### Enter Details from Bill")
-        col1, col2 = st.columns(2)
+            job = get_job(job_id)
+            polling = job is not None and job["status"] not in FINAL_STATUSES
+
+            # Extracted values only fill the form, once per upload; the user
+            # confirms them with Analyze
+            prefilled = st.session_state.setdefault('bill_prefilled', set())
+            if job is not None and job["status"] in FINAL_STATUSES and upload_key not in prefilled:
+                if job["units"]:
+                    st.session_state.units_image = int(round(job["units"]))
+                if job["bill"]:
+                    st.session_state.bill_image = float(job["bill"])
+                prefilled.add(upload_key)
+        
+            @st.fragment(run_every=2 if polling else None)
+            def show_extraction_status():
+                job = get_job(job_id)
+                if job is None:
+                    st.info("📄 Automatic extraction is no longer available for this upload. Please enter the details below.")
+                elif job["status"] == "queued":
+                    st.info("⏳ Reading your bill in the background... Feel free to keep using EcoMeter meanwhile.")
+                elif job["status"] == "done":
+                    st.success(f"✅ Read **{job['units']} kWh** and **PKR {job['bill']:,.0f}** from your bill. Check the details below and press Analyze to save them.")
+                elif job["status"] == "needs_review":
+                    st.warning("⚠️ We couldn't read both the usage and amount from this bill automatically. Please check the details below.")
+                else:
+                    st.error(f"🚨 Automatic extraction failed ({job['error']}). Please enter the details below.")
+            
+                if polling and job is not None and job["status"] in FINAL_STATUSES:
+                    st.rerun()
+        
+            show_extraction_status()
+        
+            st.markdown("### Enter Details from Bill")
+            col1, col2 = st.columns(2)
+        
+            with col1:
+                units_from_image = st.number_input(
+                    "Electricity Usage (kWh)", 
+                    min_value=0, 
+                    step=1,
+                    key="units_image",
+                    help="Enter the total units consumed as shown on your bill"
+                )
         
+            with col2:
+                bill_from_image = st.number_input(
+                    "Total Bill Amount (PKR)", 
+                    min_value=0.0, 
+                    step=10.0,
+                    key="bill_image",
+                    help="Enter the total amount to be paid"
+                )
+        
+            submitted = st.button("🔍 Analyze This Bill", type="primary", key="analyze_image")
+            if submitted:
+                if units_from_image == 0 or bill_from_image == 0:
+                    st.warning("⚠️ Please enter both usage and bill amount!")
+                    submitted = False
+                else:
+                    bill_image_filename = save_bill_image(uploaded_file)
+                
+                    eco_score, ticket = submit_usage(units_from_image, bill_from_image, bill_image_filename)
+                    st.session_state.image_result = (upload_key, units_from_image, bill_from_image, eco_score, ticket)
+
+            # Kept in session state so the rerun that ends save polling still shows it
+            image_result = st.session_state.get('image_result')
+            if image_result and image_result[0] == upload_key:
+                _, units_from_image, bill_from_image, eco_score, ticket = image_result
+
+                st.success(f"✅ Bill analyzed successfully!")
+                show_save_status(ticket, 'image_result')
+            
+                col1, col2, col3 = st.columns(3)
+            
+                with col1:
+                    st.metric("Usage", f"{units_from_image} kWh")
+            
+                with col2:
+                    st.metric("Bill Amount", f"PKR {bill_from_image:,.0f}")
+            
+                with col3:
+                    st.metric("Your EcoScore", eco_score)
+            
+                if eco_score >= 85:
+                    if submitted:
+                        st.balloons()
+                    st.success("🌟 Excellent! You're among the most efficient users! Keep up the great work! 👏")
+                elif eco_score >= 70:
+                    st.info("👍 Good effort! You're doing better than average. Check out AI suggestions to improve further.")
+                elif eco_score >= 50:
+                    st.warning("⚠️ Your usage is above average. Try our AI recommendations to reduce consumption.")
+                else:
+                    st.error("🚨 High usage detected. Let's work together to improve your energy efficiency! ⚡")
+            
+                if st.button("📈 View My Stats", key="view_stats_image"):
+                    st.session_state.page = 'Stats'
+                    st.rerun()
+
+    with tab2:
+        st.markdown("<h3 style='color: #03A9F4; text-align: center;'>Manual Data Entry</h3>", unsafe_allow_html=True)
+        st.markdown("<p style='color: #263238; text-align: center;'>Don't have a bill image? Enter your usage details manually below.</p>", unsafe_allow_html=True)
+    
+        col1, col2 = st.columns(2)
+    
         with col1:
-            units_from_image = st.number_input(
+            units_manual = st.number_input(
                 "Electricity Usage (kWh)", 
                 min_value=0, 
                 step=1,
-                key="units_image",
-                help="Enter the total units consumed as shown on your bill"
+                key="units_manual",
+                help="Enter the total units consumed this month"
             )
         
+            billing_month = st.selectbox(
+                "Billing Month",
+                ["Current Month", "Last Month", "Custom"],
+                help="Select the billing period"
+            )
+    
         with col2:
-            bill_from_image = st.number_input(
+            bill_manual = st.number_input(
                 "Total Bill Amount (PKR)", 
                 min_value=0.0, 
                 step=10.0,
-                key="bill_image",
+                key="bill_manual",
                 help="Enter the total amount to be paid"
             )
         
-        if st.button("🔍 Analyze This Bill", type="primary", key="analyze_image"):
-            if units_from_image == 0 or bill_from_image == 0:
-                st.warning("⚠️ Please enter both usage and bill amount!")
-            else:
-                with st.spinner("Calculating your EcoScore..."):
-                    time.sleep(1.5)
-                    
-                    bill_image_filename = save_bill_image(uploaded_file)
-                    
-                    updated_data = add_usage_entry(units_from_image, bill_from_image, bill_image_filename)
-                    eco_score = updated_data["eco_score"]
-                    
-                    st.success(f"✅ Bill data and image saved successfully!")
-                    
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.metric("Usage", f"{units_from_image} kWh")
-                    
-                    with col2:
-                        st.metric("Bill Amount", f"PKR {bill_from_image:,.0f}")
-                    
-                    with col3:
-                        st.metric("Your EcoScore", eco_score)
-                    
-                    if eco_score >= 85:
-                        st.balloons()
-                        st.success("🌟 Excellent! You're among the most efficient users! Keep up the great work! 👏")
-                    elif eco_score >= 70:
-                        st.info("👍 Good effort! You're doing better than average. Check out AI suggestions to improve further.")
-                    elif eco_score >= 50:
-                        st.warning("⚠️ Your usage is above average. Try our AI recommendations to reduce consumption.")
-                    else:
-                        st.error("🚨 High usage detected. Let's work together to improve your energy efficiency! ⚡")
-                    
-                    if st.button("📈 View My Stats", key="view_stats_image"):
-                        st.session_state.page = 'Stats'
-                        st.rerun()
-
-with tab2:
-    st.markdown("<h3 style='color: #03A9F4; text-align: center;'>Manual Data Entry</h3>", unsafe_allow_html=True)
-    st.markdown("<p style='color: #263238; text-align: center;'>Don't have a bill image? Enter your usage details manually below.</p>", unsafe_allow_html=True)
+            household_size = st.number_input(
+                "Household Size",
+                min_value=1,
+                max_value=20,
+                value=4,
+                help="Number of people in your household"
+            )
     
-    col1, col2 = st.columns(2)
+        st.markdown("---")
     
-    with col1:
-        units_manual = st.number_input(
-            "Electricity Usage (kWh)", 
-            min_value=0, 
-            step=1,
-            key="units_manual",
-            help="Enter the total units consumed this month"
-        )
-        
-        billing_month = st.selectbox(
-            "Billing Month",
-            ["Current Month", "Last Month", "Custom"],
-            help="Select the billing period"
-        )
+        # Calculate estimated rate
+        if units_manual > 0 and bill_manual > 0:
+            rate = bill_manual / units_manual
+            st.info(f"💰 Your average rate: **PKR {rate:.2f} per kWh**")
     
-    with col2:
-        bill_manual = st.number_input(
-            "Total Bill Amount (PKR)", 
-            min_value=0.0, 
-            step=10.0,
-            key="bill_manual",
-            help="Enter the total amount to be paid"
-        )
+        submitted = st.button("🔍 Calculate My EcoScore", type="primary", key="analyze_manual")
+        if submitted:
+            if units_manual == 0 or bill_manual == 0:
+                st.warning("⚠️ Please enter both usage and bill amount!")
+                submitted = False
+            else:
+                # Score now, save in the background
+                eco_score, ticket = submit_usage(units_manual, bill_manual)
+                st.session_state.manual_result = (units_manual, bill_manual, eco_score, ticket)
+
+        # Kept in session state so the rerun that ends save polling still shows it
+        manual_result = st.session_state.get('manual_result')
+        if manual_result and manual_result[:2] == (units_manual, bill_manual):
+            _, _, eco_score, ticket = manual_result
+
+            st.success(f"✅ EcoScore calculated!")
+            show_save_status(ticket, 'manual_result')
         
-        household_size = st.number_input(
-            "Household Size",
-            min_value=1,
-            max_value=20,
-            value=4,
-            help="Number of people in your household"
-        )
-    
-    st.markdown("---")
-    
-    # Calculate estimated rate
-    if units_manual > 0 and bill_manual > 0:
-        rate = bill_manual / units_manual
-        st.info(f"💰 Your average rate: **PKR {rate:.2f} per kWh**")
-    
-    if st.button("🔍 Calculate My EcoScore", type="primary", key="analyze_manual"):
-        if units_manual == 0 or bill_manual == 0:
-            st.warning("⚠️ Please enter both usage and bill amount!")
-        else:
-            with st.spinner("Calculating your EcoScore..."):
-                time.sleep(1.5)
-                
-                # Save data and calculate eco score
-                updated_data = add_usage_entry(units_manual, bill_manual)
-                eco_score = updated_data["eco_score"]
-                
-                st.success(f"✅ Data saved successfully!")
-                
-                # Display results in a nice card
-                st.markdown("---")
-                st.markdown("### 📊 Your Results")
-                
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.metric("Usage", f"{units_manual} kWh")
-                
-                with col2:
-                    st.metric("Bill Amount", f"PKR {bill_manual:,.0f}")
-                
-                with col3:
-                    st.metric("Your EcoScore", eco_score)
-                
-                with col4:
-                    avg_usage = 300
-                    diff = ((units_manual - avg_usage) / avg_usage) * 100
-                    st.metric("vs Average", f"{diff:+.1f}%")
-                
-                st.markdown("---")
-                
-                # Show feedback based on score
-                if eco_score >= 85:
+            # Display results in a nice card
+            st.markdown("---")
+            st.markdown("### 📊 Your Results")
+        
+            col1, col2, col3, col4 = st.columns(4)
+        
+            with col1:
+                st.metric("Usage", f"{units_manual} kWh")
+        
+            with col2:
+                st.metric("Bill Amount", f"PKR {bill_manual:,.0f}")
+        
+            with col3:
+                st.metric("Your EcoScore", eco_score)
+        
+            with col4:
+                avg_usage = get_community_average(load_user_data()["user"]["location"])
+                diff = ((units_manual - avg_usage) / avg_usage) * 100
+                st.metric("vs Average", f"{diff:+.1f}%")
+        
+            st.markdown("---")
+        
+            # Show feedback based on score
+            if eco_score >= 85:
+                if submitted:
                     st.balloons()
-                    st.success("🌟 Excellent! You're among the most efficient users! Keep up the great work! 👏")
-                    st.info("💡 **Tip:** Share your energy-saving strategies with the community to inspire others!")
-                elif eco_score >= 70:
-                    st.info("👍 Good effort! You're doing better than average.")
-                    st.info("💡 **Tip:** Try reducing AC usage by 30 minutes daily to boost your score by ~8 points.")
-                elif eco_score >= 50:
-                    st.warning("⚠️ Your usage is above average. Let's work on improving it!")
-                    st.info("💡 **Tip:** Unplug devices when not in use and switch to energy-efficient appliances.")
-                else:
-                    st.error("🚨 High usage detected. Immediate action recommended! ⚡")
-                    st.info("💡 **Tip:** Check for faulty appliances and consider a home energy audit.")
-                
-                # Navigation buttons
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    if st.button("🏠 Back to Home", key="home_manual", use_container_width=True):
-                        st.session_state.page = 'Home'
-                        st.rerun()
-                
-                with col2:
-                    if st.button("📈 View Detailed Stats", key="stats_manual", use_container_width=True):
-                        st.session_state.page = 'Stats'
-                        st.rerun()
+                st.success("🌟 Excellent! You're among the most efficient users! Keep up the great work! 👏")
+                st.info("💡 **Tip:** Share your energy-saving strategies with the community to inspire others!")
+            elif eco_score >= 70:
+                st.info("👍 Good effort! You're doing better than average.")
+                st.info("💡 **Tip:** Try reducing AC usage by 30 minutes daily to boost your score by ~8 points.")
+            elif eco_score >= 50:
+                st.warning("⚠️ Your usage is above average. Let's work on improving it!")
+                st.info("💡 **Tip:** Unplug devices when not in use and switch to energy-efficient appliances.")
+            else:
+                st.error("🚨 High usage detected. Immediate action recommended! ⚡")
+                st.info("💡 **Tip:** Check for faulty appliances and consider a home energy audit.")
+        
+            # Navigation buttons
+            col1, col2 = st.columns(2)
+        
+            with col1:
+                if st.button("🏠 Back to Home", key="home_manual", use_container_width=True):
+                    st.session_state.page = 'Home'
+                    st.rerun()
+        
+            with col2:
+                if st.button("📈 View Detailed Stats", key="stats_manual", use_container_width=True):
+                    st.session_state.page = 'Stats'
+                    st.rerun()
 
-# Information section
-st.markdown("---")
-st.markdown("### 📚 How EcoScore Works")
+    # Information section
+    st.markdown("---")
+    st.markdown("### 📚 How EcoScore Works")
 
-with st.expander("ℹ️ Click to learn more"):
-    st.markdown("""
+    with st.expander("ℹ️ Click to learn more"):
+        st.markdown("""
     **EcoScore** is your energy efficiency rating on a scale of 0-100:
     
     - **90-100:** 🌟 Exceptional - You're in the top 10% of efficient users
@@ -228,5 +307,5 @@ with st.expander("ℹ️ Click to learn more"):
     - Exclusive energy-saving tips 💡
     """)
 
-st.markdown("---")
-st.caption("💡 **Tip:** Upload your bill every month to track your progress and compete on the leaderboard!")
+    st.markdown("---")
+    st.caption("💡 **Tip:** Upload your bill every month to track your progress and compete on the leaderboard!")
@@ -0,0 +1,145 @@
+import multiprocessing
+import re
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from utils import get_bill_image_path
+
+WORKER_PROCESSES = 2
+MAX_JOBS = 1000
+
+# Tried in order; each is anchored on a consumption label so numbers like
+# "Unit 12" in an address don't match
+UNITS_PATTERNS = [
+    re.compile(
+        r"(?:units?\s+(?:consumed|used)|consumed\s+units|total\s+units|kwh\s+(?:consumed|used)|energy\s+consumed)"
+        r"\s*(?:\(kwh\))?\s*[:\-]?\s*([\d,]+(?:\.\d+)?)",
+        re.IGNORECASE
+    ),
+    re.compile(r"([\d,]+(?:\.\d+)?)\s*kwh\b", re.IGNORECASE),
+]
+AMOUNT_PATTERN = re.compile(
+    r"(?:amount\s+payable|payable\s+within\s+due\s+date|total\s+amount|amount\s+due|total\s+bill)"
+    r"[^\d]{0,30}([\d,]+(?:\.\d+)?)",
+    re.IGNORECASE
+)
+
+FINAL_STATUSES = {"done", "needs_review", "failed"}
+
+# Readings outside these are treated as misreads and left for the user
+PLAUSIBLE_UNITS = (1, 20000)
+# PKR per kWh
+PLAUSIBLE_RATE = (5, 150)
+
+_executor = None
+_image_extractor = None
+_jobs = {}
+_lock = threading.Lock()
+
+
+def register_image_extractor(extractor):
+    """Plug in OCR for image bills.
+
+    extractor(path) must return (units, amount), with None for values it
+    couldn't read. It runs in a worker process, so it has to be a
+    module-level function that pickle can import by name.
+    """
+    global _image_extractor
+    _image_extractor = extractor
+
+
+def _number(match):
+    if match is None:
+        return None
+    return float(match.group(1).replace(",", ""))
+
+
+def parse_bill_text(text):
+    units = None
+    for pattern in UNITS_PATTERNS:
+        units = _number(pattern.search(text))
+        if units is not None:
+            break
+    amount = _number(AMOUNT_PATTERN.search(text))
+
+    if units is not None and not PLAUSIBLE_UNITS[0] <= units <= PLAUSIBLE_UNITS[1]:
+        units = None
+    if units and amount and not PLAUSIBLE_RATE[0] <= amount / units <= PLAUSIBLE_RATE[1]:
+        # The amount label is the more specific one, so drop the units
+        units = None
+    if units is not None and units.is_integer():
+        units = int(units)
+    return units, amount
+
+
+def extract_pdf_text(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return ""
+    return "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+
+
+def extract_bill(path, image_extractor=None):
+    # Runs in a worker process
+    if path.lower().endswith(".pdf"):
+        return parse_bill_text(extract_pdf_text(path))
+    if image_extractor is not None:
+        return image_extractor(path)
+    return None, None
+
+
+def _get_executor(replace=False):
+    global _executor
+    if _executor is None or replace:
+        # spawn: forking the threaded Streamlit server is not safe
+        _executor = ProcessPoolExecutor(max_workers=WORKER_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def submit_bill(bill_image_filename, user_id=None):
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "filename": bill_image_filename,
+        "user_id": user_id,
+        "status": "queued",
+        "units": None,
+        "bill": None,
+        "error": None,
+        "submitted_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    with _lock:
+        _jobs[job_id] = job
+        while len(_jobs) > MAX_JOBS:
+            del _jobs[next(iter(_jobs))]
+
+    path = get_bill_image_path(bill_image_filename)
+    try:
+        future = _get_executor().submit(extract_bill, path, _image_extractor)
+    except BrokenProcessPool:
+        # A crashed worker poisons the whole pool; start a fresh one
+        future = _get_executor(replace=True).submit(extract_bill, path, _image_extractor)
+    future.add_done_callback(lambda f: _finish(job, f))
+    return job_id
+
+
+def _finish(job, future):
+    # Extracted values are only suggestions: the upload page fills them
+    # into the form and nothing is saved until the user presses Analyze.
+    try:
+        units, amount = future.result()
+    except Exception as e:
+        job.update(status="failed", error=str(e))
+        return
+
+    job.update(units=units, bill=amount, status="done" if units and amount else "needs_review")
+
+
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
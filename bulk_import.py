@@ -0,0 +1,100 @@
+import argparse
+import os
+
+import pandas as pd
+
+from achievements import backfill_achievements
+from history import MONTH_FORMAT
+from utils import calculate_eco_scores, get_community_stats, get_store, score_key
+
+CHUNK_ROWS = 50000
+
+# Same headers as the My Stats CSV export, plus a household key
+IMPORT_COLUMNS = {
+    "Household": "household",
+    "Month": "month",
+    "Usage (kWh)": "units",
+    "Bill (PKR)": "bill"
+}
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    if os.path.splitext(path)[1].lower() == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet import needs pyarrow: pip install pyarrow")
+        parquet_file = pq.ParquetFile(path)
+        columns = [name for name in parquet_file.schema_arrow.names if name in IMPORT_COLUMNS]
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=lambda name: name in IMPORT_COLUMNS)
+
+
+def validate_chunk(chunk, household=None):
+    chunk = chunk.rename(columns=IMPORT_COLUMNS)
+    if "household" not in chunk:
+        chunk["household"] = household
+
+    months = pd.to_datetime(chunk["month"], format=MONTH_FORMAT, errors="coerce")
+    units = pd.to_numeric(chunk["units"], errors="coerce")
+    bill = pd.to_numeric(chunk["bill"], errors="coerce")
+    valid = months.notna() & (units >= 0) & (bill >= 0)
+
+    cleaned = pd.DataFrame({
+        "household": chunk["household"].where(chunk["household"].notna(), household),
+        "month": months.dt.strftime(MONTH_FORMAT),
+        "units": units,
+        "bill": bill
+    })[valid]
+    # Later rows win when a chunk repeats a household's month
+    cleaned = cleaned.drop_duplicates(subset=["household", "month"], keep="last")
+    return cleaned, int((~valid).sum())
+
+
+def score_batch(units, household_sizes, households, months):
+    keys = [score_key(household, month) for household, month in zip(households, months)]
+    return calculate_eco_scores(units, household_sizes, keys).tolist()
+
+
+def import_bills(path, household=None, chunk_rows=CHUNK_ROWS):
+    store = get_store()
+    summary = {"imported": 0, "rejected": 0, "households": set()}
+
+    for chunk in iter_chunks(path, chunk_rows):
+        cleaned, rejected = validate_chunk(chunk, household)
+        summary["rejected"] += rejected
+        if cleaned.empty:
+            continue
+
+        # Whole kWh stay ints, matching entries added through the upload page;
+        # fractional kWh are kept as given and pages format them as floats
+        units = [int(u) if u.is_integer() else u for u in cleaned["units"].astype("float64").tolist()]
+        households = [h if isinstance(h, str) else None for h in cleaned["household"].tolist()]
+        rows = list(zip(households, cleaned["month"].tolist(), units, cleaned["bill"].tolist()))
+
+        store.import_usage(rows, score_batch)
+        summary["imported"] += len(rows)
+        summary["households"].update(households)
+
+    if summary["imported"]:
+        # One rescan per import instead of per-row sketch updates
+        get_community_stats().rebuild(store)
+        get_community_stats().flush()
+        backfill_achievements(store)
+
+    summary["households"] = len(summary["households"])
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import historical bills from a CSV or Parquet file")
+    parser.add_argument("path")
+    parser.add_argument("--household", help="household for rows without a Household column")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    result = import_bills(args.path, args.household, args.chunk_rows)
+    print(f"Imported {result['imported']} rows for {result['households']} households "
+          f"({result['rejected']} rejected)")
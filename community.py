@@ -0,0 +1,400 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate
+
+SKETCH_K = 200
+# Below this many observations a cohort falls back to the wider one
+MIN_COMMUNITY_SAMPLES = 30
+DEFAULT_COMMUNITY_AVERAGE = 300
+EFFICIENT_QUANTILE = 0.25
+FLUSH_SECONDS = 30
+
+# City -> region; a city that isn't listed is its own region
+LOCATION_REGIONS = {
+    "Lahore": "Punjab",
+    "Faisalabad": "Punjab",
+    "Rawalpindi": "Punjab",
+    "Multan": "Punjab",
+    "Karachi": "Sindh",
+    "Hyderabad": "Sindh",
+    "Peshawar": "Khyber Pakhtunkhwa",
+    "Quetta": "Balochistan",
+    "Islamabad": "Islamabad Capital Territory",
+}
+
+
+class QuantileSketch:
+    """Mergeable KLL-style quantile sketch with exact count/sum/min/max.
+
+    Level l holds items of weight 2**l. When a level overflows it is
+    sorted and every other item is promoted, so memory stays around
+    3 * k values however many observations are added.
+    """
+
+    def __init__(self, k=SKETCH_K):
+        self.k = k
+        self.levels = [[]]
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._offset = 0
+        self._cdf = None
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(self.k * (2 / 3) ** depth))
+
+    def update(self, value):
+        value = float(value)
+        self.levels[0].append(value)
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self.total += other.total
+        for bound, pick in (("min", min), ("max", max)):
+            values = [v for v in (getattr(self, bound), getattr(other, bound)) if v is not None]
+            setattr(self, bound, pick(values) if values else None)
+        self._compress()
+
+    def _compress(self):
+        self._cdf = None
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items = sorted(self.levels[level])
+                # An odd item out stays behind so total weight is preserved
+                leftover = [items.pop()] if len(items) % 2 else []
+                self._offset ^= 1
+                self.levels[level + 1].extend(items[self._offset::2])
+                self.levels[level] = leftover
+            level += 1
+
+    def _weighted(self):
+        if self._cdf is None:
+            pairs = sorted((v, 1 << level) for level, items in enumerate(self.levels) for v in items)
+            values = [v for v, _ in pairs]
+            cumulative = list(accumulate(w for _, w in pairs))
+            self._cdf = (values, cumulative)
+        return self._cdf
+
+    def rank(self, value):
+        """Approximate fraction of observations <= value."""
+        values, cumulative = self._weighted()
+        i = bisect_right(values, value)
+        return cumulative[i - 1] / cumulative[-1] if i else 0.0
+
+    def quantile(self, q):
+        values, cumulative = self._weighted()
+        i = bisect_left(cumulative, q * cumulative[-1])
+        return values[min(i, len(values) - 1)]
+
+    def mean(self):
+        return self.total / self.count
+
+    def to_dict(self):
+        return {
+            "k": self.k, "levels": self.levels, "count": self.count,
+            "total": self.total, "min": self.min, "max": self.max
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state["k"])
+        sketch.levels = state["levels"]
+        sketch.count = state["count"]
+        sketch.total = state["total"]
+        sketch.min = state["min"]
+        sketch.max = state["max"]
+        return sketch
+
+
+class SummaryStats:
+    """count/sum/sum of squares/min/max in constant space; add-only."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.sumsq = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value, n=1):
+        self.count += n
+        self.total += value * n
+        self.sumsq += value * value * n
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.sumsq += other.sumsq
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def std(self):
+        if not self.count:
+            return None
+        return max(0.0, self.sumsq / self.count - self.mean() ** 2) ** 0.5
+
+    def to_dict(self):
+        return {"count": self.count, "total": self.total, "sumsq": self.sumsq, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.count = state["count"]
+        stats.total = state["total"]
+        stats.sumsq = state["sumsq"]
+        stats.min = state["min"]
+        stats.max = state["max"]
+        return stats
+
+
+class RollupStats(SummaryStats):
+    """SummaryStats that also supports removal.
+
+    Values are kept as a Counter so min and max survive a removal, which
+    only stays small for values from a bounded set such as 0-100 scores.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.sumsq = 0.0
+        self.values = Counter()
+
+    def add(self, value, n=1):
+        self.count += n
+        self.total += value * n
+        self.sumsq += value * value * n
+        self.values[value] += n
+        if self.values[value] <= 0:
+            del self.values[value]
+
+    def remove(self, value):
+        self.add(value, -1)
+
+    def merge(self, other):
+        for value, n in other.values.items():
+            self.add(value, n)
+
+    @property
+    def min(self):
+        return min(self.values) if self.values else None
+
+    @property
+    def max(self):
+        return max(self.values) if self.values else None
+
+    def to_dict(self):
+        return {"values": [[value, n] for value, n in self.values.items()]}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        for value, n in state["values"]:
+            stats.add(value, n)
+        return stats
+
+
+def region_of(location):
+    return LOCATION_REGIONS.get(location, location)
+
+
+class RollupCube:
+    """Stats materialized at every level of the location hierarchy.
+
+    Each observation updates one cell per level, so any level is an O(1)
+    lookup. add_level derives a new level by merging the finest one,
+    without going back to the raw observations. Cells are stats_cls
+    instances: RollupStats where observations are retracted, SummaryStats
+    for add-only values that rarely repeat.
+    """
+
+    def __init__(self, stats_cls=RollupStats):
+        self.stats_cls = stats_cls
+        self.levels = {
+            "city": lambda location: location,
+            "region": region_of,
+            "national": lambda location: "*",
+        }
+        self.cells = {level: {} for level in self.levels}
+
+    def add_level(self, level, key_fn):
+        self.levels[level] = key_fn
+        self._derive(level)
+
+    def _derive(self, level):
+        cells = {}
+        for location, stats in self.cells["city"].items():
+            cells.setdefault(self.levels[level](location), self.stats_cls()).merge(stats)
+        self.cells[level] = cells
+
+    def add(self, location, value, n=1):
+        for level, key_fn in self.levels.items():
+            self.cells[level].setdefault(key_fn(location), self.stats_cls()).add(value, n)
+
+    def remove(self, location, value):
+        self.add(location, value, -1)
+
+    def get(self, level, location=None):
+        """Stats for the level cell containing location (national if None)."""
+        key = "*" if location is None else self.levels[level](location)
+        return self.cells[level].get(key) or self.stats_cls()
+
+    def to_dict(self):
+        return {location: stats.to_dict() for location, stats in self.cells["city"].items()}
+
+    @classmethod
+    def from_dict(cls, state, stats_cls=RollupStats):
+        cube = cls(stats_cls)
+        cube.cells["city"] = {location: stats_cls.from_dict(stats) for location, stats in state.items()}
+        for level in cube.levels:
+            if level != "city":
+                cube._derive(level)
+        return cube
+
+
+def _cohort_keys(location, household_size):
+    # Most specific first: location + household size, location, everyone
+    return [f"{location}|{household_size}", f"{location}|*", "*|*"]
+
+
+class CommunityStats:
+    """Monthly usage sketches per (location, household size), location and
+    the whole community, plus a city/region/national usage rollup, updated
+    as usage entries arrive.
+
+    Only a household's first entry for a month is recorded. Sketches
+    can't forget values, so corrected months are picked up by rebuild().
+    Sketches are read and compressed under the same lock.
+    """
+
+    def __init__(self, stats_file):
+        self.stats_file = stats_file
+        self.sketches = {}
+        self.usage_rollup = RollupCube(SummaryStats)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flusher = None
+
+    @classmethod
+    def load_or_rebuild(cls, stats_file, store):
+        stats = cls(stats_file)
+        if os.path.exists(stats_file):
+            with open(stats_file, 'r') as f:
+                state = json.load(f)
+        else:
+            state = {}
+        if "usage_summary" in state:
+            stats.sketches = {key: QuantileSketch.from_dict(sketch) for key, sketch in state["sketches"].items()}
+            stats.usage_rollup = RollupCube.from_dict(state["usage_summary"], SummaryStats)
+        else:
+            # Missing, or written before the rollup kept SummaryStats
+            stats.rebuild(store)
+        return stats
+
+    def rebuild(self, store):
+        sketches = {}
+        usage_rollup = RollupCube(SummaryStats)
+        for _, location, household_size, _, units in store.iter_usage():
+            for key in _cohort_keys(location, household_size):
+                sketches.setdefault(key, QuantileSketch()).update(units)
+            usage_rollup.add(location, units)
+        with self._lock:
+            self.sketches = sketches
+            self.usage_rollup = usage_rollup
+            self._mark_dirty()
+
+    def record(self, location, household_size, units):
+        with self._lock:
+            for key in _cohort_keys(location, household_size):
+                self.sketches.setdefault(key, QuantileSketch()).update(units)
+            self.usage_rollup.add(location, units)
+            self._mark_dirty()
+
+    def _cohort(self, location=None, household_size=None):
+        keys = _cohort_keys(location, household_size)
+        if location is None:
+            keys = keys[2:]
+        elif household_size is None:
+            keys = keys[1:]
+        for key in keys:
+            sketch = self.sketches.get(key)
+            if sketch is not None and sketch.count >= MIN_COMMUNITY_SAMPLES:
+                return sketch
+        return None
+
+    def average(self, location=None, household_size=None):
+        with self._lock:
+            sketch = self._cohort(location, household_size)
+            return round(sketch.mean()) if sketch else DEFAULT_COMMUNITY_AVERAGE
+
+    def efficiency_percentile(self, units, location=None):
+        """Share of households (0-100) using more than units."""
+        with self._lock:
+            sketch = self._cohort(location)
+            if sketch is None:
+                avg_usage = DEFAULT_COMMUNITY_AVERAGE
+                return max(0, min(100, int((1 - (units - avg_usage) / avg_usage) * 50 + 50)))
+            return max(0, min(100, round((1 - sketch.rank(units)) * 100)))
+
+    def efficient_threshold(self, location=None):
+        with self._lock:
+            sketch = self._cohort(location)
+            if sketch is None:
+                return int(DEFAULT_COMMUNITY_AVERAGE * 0.7)
+            return int(sketch.quantile(EFFICIENT_QUANTILE))
+
+    def usage_rollup_stats(self, level, location=None):
+        with self._lock:
+            return self.usage_rollup.get(level, location)
+
+    def _mark_dirty(self):
+        # Sketch files are rewritten at most every FLUSH_SECONDS
+        self._dirty = True
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="ecometer-community-stats", daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_file = self.stats_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump({
+                    "sketches": {key: sketch.to_dict() for key, sketch in self.sketches.items()},
+                    "usage_summary": self.usage_rollup.to_dict()
+                }, f)
+            os.replace(tmp_file, self.stats_file)
+            self._dirty = False
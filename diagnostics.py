@@ -0,0 +1,67 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from page_registry import PAGES
+
+DIAGNOSTICS_ENABLED = os.environ.get("ECOMETER_DIAGNOSTICS", "") == "1"
+# What a fresh server imports before Home renders
+STARTUP_MODULES = ["streamlit", "utils", "page_registry"]
+
+
+def parse_importtime(output):
+    """[(module, self_us, cumulative_us, depth)] from python -X importtime stderr."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def profile_imports(modules):
+    """Cold-import modules in a fresh interpreter and return the per-module breakdown.
+
+    A subprocess is used so modules this process has already imported are
+    measured too; raises RuntimeError if the import fails.
+    """
+    statement = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def slowest_imports(rows, limit=15):
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:limit]
+
+
+def top_level_cost(rows, modules):
+    """Cumulative microseconds for each of modules imported at top level."""
+    return {name: cumulative for name, _, cumulative, depth in rows if depth == 0 and name in modules}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time breakdown for app startup and each page")
+    parser.add_argument("modules", nargs="*", help="modules to profile (default: startup, then each page)")
+    parser.add_argument("--limit", type=int, default=15)
+    args = parser.parse_args()
+
+    targets = [args.modules] if args.modules else [STARTUP_MODULES] + [[module] for module in PAGES.values()]
+    for modules in targets:
+        print(f"== {', '.join(modules)}")
+        try:
+            rows = profile_imports(modules)
+        except RuntimeError as e:
+            print(f"   failed: {e}")
+            continue
+        total = sum(top_level_cost(rows, modules).values())
+        print(f"   total {total / 1000:.1f} ms")
+        for name, self_us, cumulative_us, _ in slowest_imports(rows, args.limit):
+            print(f"   {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
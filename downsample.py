@@ -0,0 +1,48 @@
+import numpy as np
+
+# Points per series; more than a chart's width in pixels shows no extra detail
+CHART_POINT_BUDGET = 500
+
+
+def lttb_indices(x, y, threshold=CHART_POINT_BUDGET):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the point kept
+    before it and the average of the next bucket, which preserves peaks
+    and dips. Series already within threshold are returned whole.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    # Bucket edges over the interior points 1..count-2
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = count - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = stop, edges[bucket + 2] if bucket + 2 < len(edges) else count
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample(labels, x, y, threshold=CHART_POINT_BUDGET):
+    """(labels, y) reduced to at most threshold points by LTTB over (x, y)."""
+    indices = lttb_indices(x, y, threshold)
+    if len(indices) == len(labels):
+        return labels, y
+    return [labels[i] for i in indices], np.asarray(y)[indices]
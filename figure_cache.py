@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+FIGURE_CACHE_ENTRIES = 256
+FIGURE_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class FigureCache:
+    """LRU of built Plotly figures, bounded by count and serialized bytes.
+
+    Keys carry everything a chart is drawn from (household, chart name,
+    data version), so a hit never needs validating; a rerun that hits
+    skips building the figure. Figures are kept as go.Figure objects:
+    st.plotly_chart takes their dict as already validated, whereas a
+    plain dict spec would be rebuilt into a validated go.Figure on every
+    render. Streamlit still serializes the figure each time it's sent.
+    """
+
+    def __init__(self, max_entries=FIGURE_CACHE_ENTRIES, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        """Figure for key, building it on a miss; callers must not modify it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        figure = build()
+        size = len(figure.to_json())
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (figure, size)
+                self.size += size
+            while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+        return figure
+
+
+_figures = FigureCache()
+
+
+def cached_figure(household, chart, version, build):
+    return _figures.get_or_build((household, chart, version), build)
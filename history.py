@@ -0,0 +1,142 @@
+import calendar
+import copy
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+import numpy as np
+
+MONTH_FORMAT = "%b %Y"
+
+_MONTH_NUMBERS = {name: number for number, name in enumerate(calendar.month_abbr) if name}
+
+
+def month_key(label):
+    """Ordinal for a "%b %Y" label, e.g. "Oct 2024" -> 2024 * 12 + 9."""
+    name, year = label.split()
+    return int(year) * 12 + _MONTH_NUMBERS[name] - 1
+
+
+def month_label(key):
+    year, month = divmod(key, 12)
+    return f"{calendar.month_abbr[month + 1]} {year}"
+
+
+HistoryColumns = namedtuple("HistoryColumns", ["months", "labels", "units", "bill"])
+
+
+class UsageHistory(list):
+    """usage_history kept in chronological order and indexed by month.
+
+    Still a list of entry dicts, so it serializes and reads exactly like
+    the plain list it replaces. Writes must go through upsert (append is
+    routed there) to keep the month index in step with the list.
+    """
+
+    def __init__(self, entries=()):
+        entries = sorted(entries, key=lambda entry: month_key(entry["month"]))
+        super().__init__()
+        self._keys = []
+        self._index = {}
+        self._columns = None
+        self._version = None
+        for entry in entries:
+            self.upsert(entry)
+
+    def __reduce__(self):
+        return (UsageHistory, (list(self),))
+
+    def __deepcopy__(self, memo):
+        # Already ordered, so skip the sort and upserts of __init__
+        history = self.copy()
+        for i, key in enumerate(history._keys):
+            entry = copy.deepcopy(list.__getitem__(history, i), memo)
+            list.__setitem__(history, i, entry)
+            history._index[key] = entry
+        return history
+
+    def copy(self):
+        """Shallow copy in O(n) list copies, sharing entry dicts with self.
+
+        Safe to write to: upsert replaces an entry instead of updating it
+        in place.
+        """
+        history = UsageHistory.__new__(UsageHistory)
+        list.__init__(history, self)
+        history._keys = list(self._keys)
+        history._index = dict(self._index)
+        history._columns = self._columns
+        history._version = self._version
+        return history
+
+    def upsert(self, entry):
+        key = month_key(entry["month"])
+        self._columns = None
+        self._version = None
+        existing = self._index.get(key)
+        if existing is not None:
+            # Replaced rather than updated, since copies share entry dicts
+            entry = dict(existing, **entry)
+            self._index[key] = entry
+            list.__setitem__(self, bisect_left(self._keys, key), entry)
+            return entry
+
+        entry = dict(entry)
+        self._index[key] = entry
+        if not self._keys or key > self._keys[-1]:
+            self._keys.append(key)
+            super().append(entry)
+        else:
+            # Back-filled month
+            position = bisect_left(self._keys, key)
+            self._keys.insert(position, key)
+            super().insert(position, entry)
+        return entry
+
+    append = upsert
+
+    def columns(self):
+        """Column arrays for charts and tables, rebuilt only after a write.
+
+        months are int32 ordinals (see month_key); units and bill are
+        float64 so they can back a DataFrame without per-row dicts.
+        """
+        if self._columns is None:
+            count = len(self)
+            units = np.empty(count, dtype=np.float64)
+            bill = np.empty(count, dtype=np.float64)
+            for i, entry in enumerate(self):
+                units[i] = entry["units"]
+                bill[i] = entry["bill"]
+            self._columns = HistoryColumns(
+                months=np.array(self._keys, dtype=np.int32),
+                labels=[entry["month"] for entry in self],
+                units=units,
+                bill=bill
+            )
+        return self._columns
+
+    def version(self):
+        """Checksum of months, units and bills; changes with any write that matters."""
+        if self._version is None:
+            columns = self.columns()
+            checksum = zlib.crc32(columns.months.tobytes())
+            checksum = zlib.crc32(columns.units.tobytes(), checksum)
+            self._version = zlib.crc32(columns.bill.tobytes(), checksum)
+        return self._version
+
+    def get(self, month):
+        return self._index.get(month_key(month))
+
+    def range(self, start=None, end=None):
+        """Entries between two "%b %Y" labels, both ends inclusive."""
+        lo = 0 if start is None else bisect_left(self._keys, month_key(start))
+        hi = len(self._keys) if end is None else bisect_right(self._keys, month_key(end))
+        return list.__getitem__(self, slice(lo, hi))
+
+
+def as_history(data):
+    history = data["usage_history"]
+    if not isinstance(history, UsageHistory):
+        history = data["usage_history"] = UsageHistory(history)
+    return history
@@ -0,0 +1,95 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from achievements import backfill_achievements
+from bulk_import import score_batch
+from history import as_history
+from utils import get_community_stats, get_meter_store, get_store
+
+CHUNK_ROWS = 500000
+# PKR per kWh for metered months that have no bill yet; the uploaded bill replaces it
+ESTIMATED_RATE = 23.5
+
+METER_COLUMNS = {
+    "Household": "household",
+    "Timestamp": "timestamp",
+    "Usage (kWh)": "kwh"
+}
+
+
+def validate_readings(chunk, household):
+    chunk = chunk.rename(columns=METER_COLUMNS)
+    timestamps = pd.to_datetime(chunk["timestamp"], errors="coerce")
+    kwh = pd.to_numeric(chunk["kwh"], errors="coerce")
+    households = chunk["household"].where(chunk["household"].notna(), household) if "household" in chunk else household
+    valid = timestamps.notna() & (kwh >= 0)
+
+    cleaned = pd.DataFrame({
+        "household": households,
+        # Meter clocks are local time; stored as naive epoch seconds
+        "t": timestamps.dt.tz_localize(None).astype("datetime64[s]").astype(np.int64),
+        "kwh": kwh
+    }, index=chunk.index)[valid]
+    return cleaned, int((~valid).sum())
+
+
+def ingest_readings(path, household=None, chunk_rows=CHUNK_ROWS):
+    """Append a CSV of interval readings to the meter store and refresh usage_history.
+
+    The file needs Timestamp and Usage (kWh) columns (energy used in each
+    interval) and, for several households, a Household column. Monthly
+    rollups are written to usage_history only for touched months the
+    meter covers completely; partly metered months are left alone so they
+    don't replace a bill's units or score with a partial total.
+    """
+    store = get_store()
+    meter_store = get_meter_store()
+    default_household = household or store.load()["user"]["name"]
+    summary = {"appended": 0, "skipped": 0, "rejected": 0, "partial": 0}
+    touched = {}
+
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, usecols=lambda name: name in METER_COLUMNS):
+        cleaned, rejected = validate_readings(chunk, default_household)
+        summary["rejected"] += rejected
+        for name, readings in cleaned.groupby("household", sort=False):
+            appended, skipped, months = meter_store.append(name, readings["t"].to_numpy(), readings["kwh"].to_numpy())
+            summary["appended"] += appended
+            summary["skipped"] += skipped
+            touched.setdefault(name, set()).update(months)
+
+    rows = []
+    for name, months in touched.items():
+        history = as_history(store.load(name))
+        covered = [month for month in months if meter_store.covers_month(name, month)]
+        summary["partial"] += len(months) - len(covered)
+        for month, units in meter_store.monthly_usage(name, covered):
+            units = round(units, 2)
+            units = int(units) if float(units).is_integer() else units
+            existing = history.get(month)
+            bill = existing["bill"] if existing else round(units * ESTIMATED_RATE, 2)
+            rows.append((name, month, units, bill))
+
+    if rows:
+        store.import_usage(rows, score_batch)
+        get_community_stats().rebuild(store)
+        get_community_stats().flush()
+        backfill_achievements(store)
+
+    summary["households"] = len(touched)
+    summary["months"] = len(rows)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest smart-meter interval readings from a CSV file")
+    parser.add_argument("path")
+    parser.add_argument("--household", help="household for rows without a Household column")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    result = ingest_readings(args.path, args.household, args.chunk_rows)
+    print(f"Appended {result['appended']} readings for {result['households']} households "
+          f"({result['skipped']} already stored, {result['rejected']} rejected); "
+          f"updated {result['months']} months ({result['partial']} partly metered months left as they were)")
@@ -0,0 +1,55 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Page name (st.session_state.page) -> module exposing render()
+PAGES = {
+    "Upload": "app_pages.upload_bill",
+    "Stats": "app_pages.my_stats",
+    "Leaderboard": "app_pages.leaderboard",
+}
+
+# Development: re-import a page when its source file changes on disk
+DEV_RELOAD = os.environ.get("ECOMETER_DEV_RELOAD", "") == "1"
+
+_modules = {}
+_mtimes = {}
+# Seconds each page's first import took in this process, for diagnostics
+load_times = {}
+_lock = threading.Lock()
+
+
+def get_page(name):
+    """The page module for name, imported once per process.
+
+    Python compiles it once and caches the bytecode, so a rerun only
+    calls render(). A page Streamlit's file watcher has dropped from
+    sys.modules after an edit is imported again. With DEV_RELOAD the
+    source mtime is checked as well, for runs without the watcher.
+    """
+    with _lock:
+        module = _modules.get(name)
+        if module is None or sys.modules.get(PAGES[name]) is not module:
+            started = time.perf_counter()
+            module = _modules[name] = importlib.import_module(PAGES[name])
+            load_times[name] = time.perf_counter() - started
+            _mtimes[name] = _source_mtime(module)
+        elif DEV_RELOAD:
+            mtime = _source_mtime(module)
+            if mtime != _mtimes[name]:
+                module = _modules[name] = importlib.reload(module)
+                _mtimes[name] = mtime
+        return module
+
+
+def render_page(name):
+    get_page(name).render()
+
+
+def _source_mtime(module):
+    try:
+        return os.stat(module.__file__).st_mtime_ns
+    except OSError:
+        return None
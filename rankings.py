@@ -0,0 +1,192 @@
+import threading
+from bisect import bisect_left, insort
+
+from community import RollupCube
+
+MAX_SCORE = 100
+HISTOGRAM_BIN_WIDTH = 10
+HISTOGRAM_BINS = MAX_SCORE // HISTOGRAM_BIN_WIDTH
+
+
+class ScoreRankIndex:
+    """Order-statistic index over integer EcoScores (0-MAX_SCORE).
+
+    A Fenwick tree counts members per score, ordered best score first,
+    and each score keeps a name-sorted bucket of members. Rank, select
+    and windows cost O(log MAX_SCORE + log bucket size) however many
+    households are indexed.
+    """
+
+    def __init__(self):
+        self._tree = [0] * (MAX_SCORE + 2)
+        self._buckets = [[] for _ in range(MAX_SCORE + 1)]
+        self._scores = {}
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, key):
+        return key in self._scores
+
+    def _position(self, score):
+        # 1-based Fenwick position; the best score comes first
+        return MAX_SCORE - score + 1
+
+    def _bump(self, score, delta):
+        i = self._position(score)
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, position):
+        total = 0
+        while position > 0:
+            total += self._tree[position]
+            position -= position & -position
+        return total
+
+    def add(self, key, score):
+        score = max(0, min(MAX_SCORE, int(score)))
+        if key in self._scores:
+            if self._scores[key] == score:
+                return
+            self.remove(key)
+        self._scores[key] = score
+        insort(self._buckets[score], key)
+        self._bump(score, 1)
+
+    def remove(self, key):
+        score = self._scores.pop(key, None)
+        if score is None:
+            return
+        bucket = self._buckets[score]
+        del bucket[bisect_left(bucket, key)]
+        self._bump(score, -1)
+
+    def score(self, key):
+        return self._scores.get(key)
+
+    def rank(self, key):
+        """1-based rank, or None if key isn't indexed."""
+        score = self._scores.get(key)
+        if score is None:
+            return None
+        higher = self._prefix(self._position(score) - 1)
+        return higher + bisect_left(self._buckets[score], key) + 1
+
+    def select(self, index):
+        """Key at 0-based position index in ranking order."""
+        position = 0
+        remaining = index + 1
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = position + step
+            if nxt < len(self._tree) and self._tree[nxt] < remaining:
+                position = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        score = MAX_SCORE - position
+        return self._buckets[score][remaining - 1]
+
+    def slice(self, start, stop):
+        """Keys ranked start..stop-1 (0-based), walking buckets in order."""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        first = self.select(start)
+        score = self._scores[first]
+        offset = bisect_left(self._buckets[score], first)
+        keys = []
+        while len(keys) < stop - start:
+            bucket = self._buckets[score]
+            keys.extend(bucket[offset:offset + stop - start - len(keys)])
+            score -= 1
+            offset = 0
+        return keys
+
+
+def histogram_bin(score):
+    # The top bin is closed so a perfect score lands in 90-100
+    return min(int(score) // HISTOGRAM_BIN_WIDTH, HISTOGRAM_BINS - 1)
+
+
+class Leaderboard:
+    """Global and per-location rank indexes plus each member's display record.
+
+    Fixed-width EcoScore histograms, overall and per location, and a
+    city/region/national score rollup are kept alongside as counters so
+    charts and averages never scan members.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.overall = ScoreRankIndex()
+        self.by_location = {}
+        self.histograms = {None: [0] * HISTOGRAM_BINS}
+        self.score_rollup = RollupCube()
+        self._lock = threading.RLock()
+
+    def _index(self, location=None):
+        if location is None:
+            return self.overall
+        return self.by_location.get(location) or ScoreRankIndex()
+
+    def _count(self, record, delta):
+        bin_index = histogram_bin(record["eco_score"])
+        self.histograms[None][bin_index] += delta
+        self.histograms.setdefault(record["location"], [0] * HISTOGRAM_BINS)[bin_index] += delta
+        self.score_rollup.add(record["location"], record["eco_score"], delta)
+
+    def upsert(self, record):
+        with self._lock:
+            key = record["name"]
+            previous = self.records.get(key)
+            if previous is not None:
+                self._count(previous, -1)
+                if previous["location"] != record["location"]:
+                    self.by_location[previous["location"]].remove(key)
+            self.records[key] = record
+            self._count(record, 1)
+            self.overall.add(key, record["eco_score"])
+            self.by_location.setdefault(record["location"], ScoreRankIndex()).add(key, record["eco_score"])
+
+    def remove(self, key):
+        with self._lock:
+            record = self.records.pop(key, None)
+            if record is not None:
+                self._count(record, -1)
+                self.overall.remove(key)
+                self.by_location[record["location"]].remove(key)
+
+    def count(self, location=None):
+        return len(self._index(location))
+
+    def rank(self, key, location=None):
+        with self._lock:
+            return self._index(location).rank(key)
+
+    def page(self, start, stop, location=None):
+        with self._lock:
+            return [self.records[key] for key in self._index(location).slice(start, stop)]
+
+    def top(self, k, location=None):
+        return self.page(0, k, location)
+
+    def histogram(self, location=None):
+        """Member counts per HISTOGRAM_BIN_WIDTH-wide EcoScore bin."""
+        with self._lock:
+            return list(self.histograms.get(location) or [0] * HISTOGRAM_BINS)
+
+    def score_stats(self, level, location=None):
+        """RollupStats of EcoScores at level ("city", "region" or "national")."""
+        with self._lock:
+            return self.score_rollup.get(level, location)
+
+    def around(self, key, radius, location=None):
+        """(first_rank, records) for the members ranked within radius of key."""
+        with self._lock:
+            rank = self._index(location).rank(key)
+            if rank is None:
+                return None, []
+            start = max(0, rank - 1 - radius)
+            return start + 1, self.page(start, rank + radius, location)
@@ -0,0 +1,130 @@
+import struct
+
+import numpy as np
+
+# Readings per sealed block
+BLOCK_SIZE = 1024
+
+# Gorilla delta-of-delta buckets: (control bits, control width, value width).
+# A zero delta-of-delta is the single bit '0'.
+_DOD_BUCKETS = [
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+    (0b1111, 4, 64),
+]
+
+# count, first timestamp, first value's bits
+_HEADER = struct.Struct("<IqQ")
+
+
+def _bit_matrix(words):
+    """(n, 64) MSB-first bits of uint64 words."""
+    return np.unpackbits(np.ascontiguousarray(words, dtype=">u8").view(np.uint8).reshape(-1, 8), axis=1)
+
+
+def _pack_fields(payloads, widths):
+    """Concatenate the low widths bits of each payload, MSB first, row-major."""
+    keep = np.arange(64) >= (64 - widths.reshape(-1))[:, None]
+    return np.packbits(_bit_matrix(payloads.reshape(-1))[keep]).tobytes()
+
+
+def encode_block(timestamps, values):
+    """Gorilla-style encoding of one block of (epoch seconds, float) readings.
+
+    Timestamps are stored as delta-of-deltas in variable-width buckets, so
+    a meter on a steady interval costs one bit per timestamp. Values are
+    XORed with the previous one and only the meaningful bits are kept.
+    Unlike Gorilla, the leading-zeros/length window is written for every
+    changed value instead of being reused from the previous one; that
+    makes each reading's fields independent, so the block is packed with
+    numpy in one pass.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    bits = np.asarray(values, dtype=np.float64).view(np.uint64)
+    header = _HEADER.pack(len(timestamps), int(timestamps[0]), int(bits[0]))
+    if len(timestamps) == 1:
+        return header
+
+    # Four field slots per reading: dod, dod overflow, xor header, xor bits
+    count = len(timestamps) - 1
+    payloads = np.zeros((count, 4), dtype=np.uint64)
+    widths = np.zeros((count, 4), dtype=np.int64)
+
+    dods = np.diff(np.diff(timestamps), prepend=0)
+    widths[:, 0] = 1
+    unplaced = dods != 0
+    for control, control_width, width in _DOD_BUCKETS:
+        if width == 64:
+            chosen = unplaced
+            payloads[chosen, 0] = control
+            widths[chosen, 0] = control_width
+            payloads[chosen, 1] = dods[chosen].view(np.uint64)
+            widths[chosen, 1] = 64
+            break
+        limit = 1 << (width - 1)
+        chosen = unplaced & (dods >= -limit) & (dods < limit)
+        signed = (dods[chosen] & ((1 << width) - 1)).astype(np.uint64)
+        payloads[chosen, 0] = (np.uint64(control) << np.uint64(width)) | signed
+        widths[chosen, 0] = control_width + width
+        unplaced &= ~chosen
+
+    xors = bits[1:] ^ bits[:-1]
+    changed = xors != 0
+    matrix = _bit_matrix(xors[changed])
+    leading = np.minimum(np.argmax(matrix, axis=1), 31)
+    trailing = np.argmax(matrix[:, ::-1], axis=1)
+    meaningful = 64 - leading - trailing
+
+    widths[:, 2] = 1
+    # '1', 5 bits of leading zeros, 6 bits of length (64 stored as 0)
+    payloads[changed, 2] = ((1 << 11) | (leading << 6) | (meaningful & 63)).astype(np.uint64)
+    widths[changed, 2] = 12
+    payloads[changed, 3] = xors[changed] >> trailing.astype(np.uint64)
+    widths[changed, 3] = meaningful
+    return header + _pack_fields(payloads, widths)
+
+
+def decode_block(data):
+    """(timestamps, values) arrays from encode_block output."""
+    count, t, value = _HEADER.unpack_from(data)
+    timestamps = np.empty(count, dtype=np.int64)
+    bits = np.empty(count, dtype=np.uint64)
+    timestamps[0] = t
+    bits[0] = value
+    stream = (np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=_HEADER.size)) + ord("0")).tobytes().decode()
+
+    position = 0
+    delta = 0
+    for i in range(1, count):
+        if stream[position] == "0":
+            position += 1
+        else:
+            for control, control_width, width in _DOD_BUCKETS:
+                if int(stream[position:position + control_width], 2) == control:
+                    break
+            position += control_width
+            dod = int(stream[position:position + width], 2)
+            if dod >= 1 << (width - 1):
+                dod -= 1 << width
+            position += width
+            delta += dod
+        t += delta
+        timestamps[i] = t
+
+        if stream[position] == "0":
+            position += 1
+        else:
+            leading = int(stream[position + 1:position + 6], 2)
+            meaningful = int(stream[position + 6:position + 12], 2) or 64
+            position += 12
+            value ^= int(stream[position:position + meaningful], 2) << (64 - leading - meaningful)
+            position += meaningful
+        bits[i] = value
+    return timestamps, bits.view(np.float64)
+
+
+def block_summary(timestamps, values):
+    """(t_min, t_max, count, v_min, v_max, v_sum) for a block's index entry."""
+    return (int(timestamps[0]), int(timestamps[-1]), len(values),
+            float(values.min()), float(values.max()), float(values.sum()))
@@ -0,0 +1,606 @@
+import copy
+import json
+import os
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; writes are then only serialized within a process
+    fcntl = None
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from history import as_history, month_key
+
+COMPACT_THRESHOLD = 50
+DOCUMENT_CACHE_SIZE = 1024
+
+
+def apply_usage_event(data, event):
+    data["current_month"] = {
+        "units": event["units"],
+        "bill": event["bill"],
+        "date_uploaded": event["date_uploaded"],
+        "bill_image": event["bill_image"]
+    }
+
+    data["eco_score"] = event["eco_score"]
+
+    as_history(data).upsert({
+        "month": event["month"],
+        "units": event["units"],
+        "bill": event["bill"],
+        "bill_image": event["bill_image"]
+    })
+    _add_achievements(data, event.get("achievements", []))
+    return data
+
+
+def _add_achievements(data, badges):
+    earned = data.setdefault("achievements", [])
+    titles = {badge["title"] for badge in earned}
+    earned.extend(badge for badge in badges if badge["title"] not in titles)
+
+
+def _writable_copy(data):
+    """Copy of a cached document that apply_usage_event and the other
+    writers can modify: only the containers they change in place are
+    copied, so a write doesn't pay for the whole document."""
+    data = dict(data)
+    data["usage_history"] = as_history(data).copy()
+    if "achievements" in data:
+        data["achievements"] = list(data["achievements"])
+    return data
+
+
+class DocumentCache:
+    """Process-wide LRU of parsed household documents.
+
+    Each entry is stored with a validity token chosen by the store; a
+    lookup only hits when the caller's token matches. Cached documents are
+    shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=DOCUMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, token, value):
+        with self._lock:
+            self._entries[key] = (token, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _stat_token(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class JsonStore:
+    """Snapshot file plus an append-only journal of usage events.
+
+    Every submission appends one line to the journal. A background thread
+    folds the journal into the snapshot once it grows past
+    COMPACT_THRESHOLD events. Events carry a sequence number and the
+    snapshot records the last one it contains, so a crash between writing
+    the snapshot and truncating the journal never applies an event twice.
+    """
+
+    def __init__(self, data_file, log_file, default_factory):
+        self.data_file = data_file
+        self.log_file = log_file
+        self.lock_file = data_file + ".lock"
+        self.default_factory = default_factory
+        self._lock = threading.RLock()
+        self._compact_requested = threading.Event()
+        self._compactor = None
+        self.cache = DocumentCache()
+        # Bumped on every in-process write so a rewrite that lands within
+        # the filesystem's mtime granularity still invalidates the cache.
+        self.version = 0
+
+    @contextmanager
+    def _writing(self):
+        # The app and the import CLIs are separate processes; without the
+        # file lock a CLI's snapshot rewrite could truncate journal events
+        # the app appended after the CLI read them
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_file, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # The JSON file holds a single household, so user_id is accepted for
+    # API compatibility with SqliteStore and otherwise ignored.
+    def load(self, user_id=None):
+        data, _, _ = self._read()
+        return data
+
+    def save(self, data, user_id=None):
+        with self._writing():
+            _, seq, _ = self._read()
+            data = copy.deepcopy(data)
+            self._write_snapshot(data, seq)
+            self._truncate_log()
+            self._remember(data, seq, 0)
+
+    def append_usage(self, event, user_id=None):
+        with self._writing():
+            data, seq, pending = self._read()
+            data = _writable_copy(data)
+            event = dict(event, seq=seq + 1)
+            self._append_line(json.dumps(event))
+            if pending + 1 >= COMPACT_THRESHOLD:
+                self._request_compaction()
+            apply_usage_event(data, event)
+            self._remember(data, event["seq"], pending + 1)
+            return data
+
+    def compact(self):
+        with self._writing():
+            data, seq, pending = self._read()
+            if pending == 0:
+                return
+            self._write_snapshot(data, seq)
+            self._truncate_log()
+            self._remember(data, seq, 0)
+
+    def import_usage(self, rows, score_fn):
+        """Upsert (household, month, units, bill) rows in one snapshot write.
+
+        score_fn takes lists of units, household sizes, household names and
+        months and returns the matching eco scores; it is applied to the
+        latest month.
+        """
+        with self._writing():
+            data, seq, _ = self._read()
+            households = {household for household, _, _, _ in rows}
+            if households - {None, data["user"]["name"]}:
+                raise ValueError("user_data.json holds a single household; import several with ECOMETER_STORAGE=sqlite")
+            data = _writable_copy(data)
+            history = as_history(data)
+            for _, month, units, bill in rows:
+                history.upsert({"month": month, "units": units, "bill": bill})
+            if history:
+                latest = history[-1]
+                data["eco_score"] = score_fn(
+                    [latest["units"]], [data["user"]["household_size"]], [data["user"]["name"]], [latest["month"]]
+                )[0]
+            self._write_snapshot(data, seq)
+            self._truncate_log()
+            self._remember(data, seq, 0)
+
+    def award_achievements(self, badges, user_id=None):
+        with self._writing():
+            data, seq, _ = self._read()
+            data = _writable_copy(data)
+            _add_achievements(data, badges)
+            self._write_snapshot(data, seq)
+            self._truncate_log()
+            self._remember(data, seq, 0)
+
+    def iter_usage(self):
+        """Yield (household, location, household_size, month, units) rows."""
+        data = self.load()
+        user = data["user"]
+        for entry in data["usage_history"]:
+            yield user["name"], user["location"], user["household_size"], entry["month"], entry["units"]
+
+    def iter_profiles(self):
+        """Yield (household, location, household_size, eco_score) rows."""
+        data = self.load()
+        user = data["user"]
+        yield user["name"], user["location"], user["household_size"], data["eco_score"]
+
+    def _token(self):
+        return (self.version, _stat_token(self.data_file), _stat_token(self.log_file))
+
+    def _remember(self, data, seq, pending):
+        self.version += 1
+        self.cache.put(self.data_file, self._token(), (data, seq, pending))
+
+    def _read(self):
+        # Taken before parsing: a write racing the parse leaves a stale
+        # token behind, which just forces a re-read next time.
+        token = self._token()
+        entry = self.cache.get(self.data_file)
+        if entry is not None and entry[0] == token:
+            return entry[1]
+
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+        else:
+            data = self.default_factory()
+        seq = data.pop("_log_seq", 0)
+        as_history(data)
+
+        pending = 0
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'r') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-append
+                        continue
+                    if event["seq"] <= seq:
+                        continue
+                    apply_usage_event(data, event)
+                    seq = event["seq"]
+                    pending += 1
+
+        self.cache.put(self.data_file, token, (data, seq, pending))
+        return data, seq, pending
+
+    def _append_line(self, line):
+        with open(self.log_file, 'ab') as f:
+            # Start on a fresh line if a previous append was torn
+            if f.tell() > 0:
+                with open(self.log_file, 'rb') as tail:
+                    tail.seek(-1, os.SEEK_END)
+                    if tail.read(1) != b"\n":
+                        line = "\n" + line
+            f.write((line + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, data, seq):
+        tmp_file = self.data_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(dict(data, _log_seq=seq), f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.data_file)
+
+    def _truncate_log(self):
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'w'):
+                pass
+
+    def _request_compaction(self):
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_loop, name="ecometer-compactor", daemon=True)
+            self._compactor.start()
+        self._compact_requested.set()
+
+    def _compact_loop(self):
+        while True:
+            self._compact_requested.wait()
+            self._compact_requested.clear()
+            self.compact()
+
+
+SELECT_USER = (
+    "SELECT id, username, household_size, location, created_at, eco_score, updated_at "
+    "FROM users WHERE username = ?"
+)
+SELECT_USER_UPDATED_AT = "SELECT updated_at FROM users WHERE username = ?"
+SELECT_BILL_UNITS = "SELECT month, units FROM bills WHERE user_id = ?"
+SELECT_BILLS = "SELECT month, units, amount, bill_image_path, uploaded_at FROM bills WHERE user_id = ? ORDER BY id"
+SELECT_ACHIEVEMENTS = (
+    "SELECT a.icon, a.name, a.description, ua.earned_at FROM user_achievements ua "
+    "JOIN achievements a ON a.id = ua.achievement_id WHERE ua.user_id = ? ORDER BY ua.id"
+)
+COUNT_CHALLENGES_COMPLETED = "SELECT COUNT(*) FROM user_challenges WHERE user_id = ? AND completed = 1"
+INSERT_USER = (
+    "INSERT INTO users (email, username, hashed_password, full_name, household_size, location, "
+    "created_at, updated_at, is_active, eco_score) VALUES (?, ?, '', ?, ?, ?, ?, ?, 1, ?)"
+)
+UPDATE_USER = "UPDATE users SET household_size = ?, location = ?, eco_score = ?, updated_at = ? WHERE id = ?"
+UPDATE_USER_SCORE = "UPDATE users SET eco_score = ?, updated_at = ? WHERE id = ?"
+UPDATE_USER_TOUCH = "UPDATE users SET updated_at = ? WHERE id = ?"
+UPDATE_BILL = "UPDATE bills SET units = ?, amount = ?, bill_image_path = ?, uploaded_at = ? WHERE user_id = ? AND month = ?"
+UPDATE_BILL_AMOUNTS = "UPDATE bills SET units = ?, amount = ? WHERE user_id = ? AND month = ?"
+INSERT_BILL = "INSERT INTO bills (user_id, month, units, amount, bill_image_path, uploaded_at) VALUES (?, ?, ?, ?, ?, ?)"
+DELETE_BILLS = "DELETE FROM bills WHERE user_id = ?"
+INSERT_USAGE_RECORD = "INSERT INTO usage_records (user_id, date, units, bill_amount, eco_score) VALUES (?, ?, ?, ?, ?)"
+INSERT_ACHIEVEMENT = (
+    "INSERT OR IGNORE INTO achievements (name, description, icon, criteria_type, criteria_value) "
+    "VALUES (?, ?, ?, NULL, NULL)"
+)
+INSERT_USER_ACHIEVEMENT = (
+    "INSERT INTO user_achievements (user_id, achievement_id, earned_at) "
+    "SELECT ?, a.id, ? FROM achievements a WHERE a.name = ? AND NOT EXISTS "
+    "(SELECT 1 FROM user_achievements ua WHERE ua.user_id = ? AND ua.achievement_id = a.id)"
+)
+
+SELECT_ALL_USAGE = (
+    "SELECT u.username, u.location, u.household_size, b.month, b.units "
+    "FROM bills b JOIN users u ON u.id = b.user_id"
+)
+
+SELECT_ALL_PROFILES = "SELECT username, location, household_size, eco_score FROM users WHERE is_active = 1"
+
+SCHEMA_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_bills_user_month ON bills (user_id, month)",
+    "CREATE INDEX IF NOT EXISTS ix_usage_records_user ON usage_records (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_achievements_user ON user_achievements (user_id)",
+]
+
+
+class ConnectionPool:
+    def __init__(self, db_file, size=4):
+        self.db_file = db_file
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Statements are compiled once per connection and reused from
+        # sqlite3's statement cache, keyed by the SQL text above.
+        conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+
+class SqliteStore:
+    """Multi-household store backed by the backend/ecometer.db schema.
+
+    Households are keyed by username; ``user_id=None`` means default_user.
+    Loaded documents are cached until ``PRAGMA data_version`` reports a
+    commit from another connection and the household's updated_at differs.
+    """
+
+    def __init__(self, db_file, default_user, pool_size=4):
+        self.default_user = default_user
+        self.pool = ConnectionPool(db_file, pool_size)
+        self.cache = DocumentCache()
+        with self.pool.connection() as conn:
+            with conn:
+                for statement in SCHEMA_INDEXES:
+                    conn.execute(statement)
+        self._watcher = sqlite3.connect(db_file, check_same_thread=False)
+        self._watcher_lock = threading.Lock()
+
+    def _data_version(self):
+        with self._watcher_lock:
+            return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self, user_id=None):
+        username = user_id or self.default_user
+        data_version = self._data_version()
+        entry = self.cache.get(username)
+        if entry is not None:
+            (checked_version, updated_at), data = entry
+            if checked_version == data_version:
+                return data
+            with self.pool.connection() as conn:
+                row = conn.execute(SELECT_USER_UPDATED_AT, (username,)).fetchone()
+            if (row[0] if row else None) == updated_at:
+                self.cache.put(username, (data_version, updated_at), data)
+                return data
+
+        data = self._read(username)
+        self.cache.put(username, (data_version, data.pop("_updated_at")), data)
+        return data
+
+    def _read(self, username):
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_USER, (username,)).fetchone()
+            if row is None:
+                data = self._empty_document(username)
+                as_history(data)
+                return dict(data, _updated_at=None)
+            user_pk, name, household_size, location, created_at, eco_score, updated_at = row
+            bills = conn.execute(SELECT_BILLS, (user_pk,)).fetchall()
+            achievements = conn.execute(SELECT_ACHIEVEMENTS, (user_pk,)).fetchall()
+            challenges_completed = conn.execute(COUNT_CHALLENGES_COMPLETED, (user_pk,)).fetchone()[0]
+
+        data = self._empty_document(name)
+        data["user"]["household_size"] = household_size or 4
+        data["user"]["location"] = location or ""
+        if created_at:
+            data["user"]["joined_date"] = created_at[:10]
+        data["eco_score"] = eco_score or 0
+        data["challenges_completed"] = challenges_completed
+        data["achievements"] = [
+            {"icon": icon, "title": title, "desc": desc, "earned_at": earned_at}
+            for icon, title, desc, earned_at in achievements
+        ]
+
+        latest = None
+        for month, units, amount, bill_image, uploaded_at in bills:
+            # units is a FLOAT column; the pages format whole kWh with :d
+            units = int(units) if float(units).is_integer() else units
+            data["usage_history"].append({
+                "month": month,
+                "units": units,
+                "bill": amount,
+                "bill_image": bill_image
+            })
+            if uploaded_at and (latest is None or uploaded_at >= latest[4]):
+                latest = (month, units, amount, bill_image, uploaded_at)
+
+        if latest is not None:
+            data["current_month"] = {
+                "units": latest[1],
+                "bill": latest[2],
+                "date_uploaded": latest[4][:19],
+                "bill_image": latest[3]
+            }
+        as_history(data)
+        data["_updated_at"] = updated_at
+        return data
+
+    def save(self, data, user_id=None):
+        username = user_id or data["user"]["name"]
+        self.cache.invalidate(username)
+        # Microsecond precision: updated_at doubles as the cache validator
+        now = datetime.now().isoformat(" ")
+        with self.pool.connection() as conn:
+            with conn:
+                user_pk = self._ensure_user(conn, username, data["user"], now)
+                conn.execute(UPDATE_USER, (
+                    data["user"]["household_size"], data["user"]["location"], data["eco_score"], now, user_pk
+                ))
+                conn.execute(DELETE_BILLS, (user_pk,))
+                conn.executemany(INSERT_BILL, [
+                    (user_pk, entry["month"], entry["units"], entry["bill"], entry.get("bill_image"), now)
+                    for entry in data["usage_history"]
+                ])
+        self.cache.invalidate(username)
+
+    def append_usage(self, event, user_id=None):
+        username = user_id or self.default_user
+        with self.pool.connection() as conn:
+            with conn:
+                user_pk = self._ensure_user(conn, username, None, event["date_uploaded"])
+                bill_row = (event["units"], event["bill"], event["bill_image"], event["date_uploaded"])
+                updated = conn.execute(UPDATE_BILL, bill_row + (user_pk, event["month"])).rowcount
+                if updated == 0:
+                    conn.execute(INSERT_BILL, (user_pk, event["month"]) + bill_row)
+                conn.execute(INSERT_USAGE_RECORD, (
+                    user_pk, event["date_uploaded"], event["units"], event["bill"], event["eco_score"]
+                ))
+                conn.execute(UPDATE_USER_SCORE, (event["eco_score"], datetime.now().isoformat(" "), user_pk))
+                self._award(conn, user_pk, event.get("achievements", []))
+        self.cache.invalidate(username)
+        return self.load(username)
+
+    def award_achievements(self, badges, user_id=None):
+        username = user_id or self.default_user
+        with self.pool.connection() as conn:
+            with conn:
+                user_pk = self._ensure_user(conn, username, None, datetime.now().isoformat(" "))
+                self._award(conn, user_pk, badges)
+                # updated_at is the cache validator for other processes
+                conn.execute(UPDATE_USER_TOUCH, (datetime.now().isoformat(" "), user_pk))
+        self.cache.invalidate(username)
+
+    def _award(self, conn, user_pk, badges):
+        conn.executemany(INSERT_ACHIEVEMENT, [(badge["title"], badge["desc"], badge["icon"]) for badge in badges])
+        conn.executemany(INSERT_USER_ACHIEVEMENT, [
+            (user_pk, badge["earned_at"], badge["title"], user_pk) for badge in badges
+        ])
+
+    def import_usage(self, rows, score_fn):
+        """Upsert (household, month, units, bill) rows in a single transaction.
+
+        Imported bills keep uploaded_at NULL so they never displace a real
+        upload as the household's current month. Eco scores are recomputed
+        for every touched household in one score_fn call.
+        """
+        pending = {}
+        for household, month, units, bill in rows:
+            pending[(household or self.default_user, month)] = (units, bill)
+        usernames = sorted({username for username, _ in pending})
+        now = datetime.now().isoformat(" ")
+
+        with self.pool.connection() as conn:
+            with conn:
+                users = {}
+                for username in usernames:
+                    user_pk = self._ensure_user(conn, username, None, now)
+                    household_size = conn.execute(SELECT_USER, (username,)).fetchone()[2] or 4
+                    users[username] = (user_pk, household_size, dict(conn.execute(SELECT_BILL_UNITS, (user_pk,))))
+
+                updates, inserts = [], []
+                for (username, month), (units, bill) in pending.items():
+                    user_pk, _, months = users[username]
+                    if month in months:
+                        updates.append((units, bill, user_pk, month))
+                    else:
+                        inserts.append((user_pk, month, units, bill, None, None))
+                    months[month] = units
+                conn.executemany(UPDATE_BILL_AMOUNTS, updates)
+                conn.executemany(INSERT_BILL, inserts)
+
+                latest_units, sizes, latest_months = [], [], []
+                for username in usernames:
+                    _, household_size, months = users[username]
+                    latest_month = max(months, key=month_key)
+                    latest_units.append(months[latest_month])
+                    sizes.append(household_size)
+                    latest_months.append(latest_month)
+                scores = score_fn(latest_units, sizes, usernames, latest_months)
+                conn.executemany(UPDATE_USER_SCORE, [
+                    (int(score), now, users[username][0]) for username, score in zip(usernames, scores)
+                ])
+
+        for username in usernames:
+            self.cache.invalidate(username)
+
+    def iter_usage(self):
+        """Yield (household, location, household_size, month, units) rows."""
+        with self.pool.connection() as conn:
+            for username, location, household_size, month, units in conn.execute(SELECT_ALL_USAGE):
+                yield username, location or "", household_size or 4, month, units
+
+    def iter_profiles(self):
+        """Yield (household, location, household_size, eco_score) rows."""
+        with self.pool.connection() as conn:
+            for username, location, household_size, eco_score in conn.execute(SELECT_ALL_PROFILES):
+                yield username, location or "", household_size or 4, eco_score or 0
+
+    def _ensure_user(self, conn, username, user, now):
+        row = conn.execute(SELECT_USER, (username,)).fetchone()
+        if row is not None:
+            return row[0]
+        user = user or self._empty_document(username)["user"]
+        cursor = conn.execute(INSERT_USER, (
+            f"{username}@ecometer.local", username, username,
+            user["household_size"], user["location"], now, now, 0
+        ))
+        return cursor.lastrowid
+
+    def _empty_document(self, username):
+        return {
+            "user": {
+                "name": username,
+                "household_size": 4,
+                "location": "",
+                "joined_date": datetime.now().strftime("%Y-%m-%d")
+            },
+            "usage_history": [],
+            "current_month": {
+                "units": 0,
+                "bill": 0,
+                "date_uploaded": None
+            },
+            "eco_score": 0,
+            "achievements": [],
+            "challenges_completed": 0
+        }
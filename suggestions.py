@@ -0,0 +1,189 @@
+import warnings
+
+import numpy as np
+
+from history import as_history
+from storage import DocumentCache
+
+FEATURES = ("eco_score", "cohort_deviation", "trend", "seasonality", "rate")
+TREND_MONTHS = 6
+SEASON_MONTHS = 24
+# May-Sep as 0-based months of the year
+SUMMER_MONTHS = (4, 5, 6, 7, 8)
+# Cached suggestion lists are a few short strings, so far more of them
+# fit than parsed documents; precomputing stops once the cache is full
+SUGGESTION_CACHE_SIZE = 20000
+PRECOMPUTE_BATCH = 500
+
+ABOVE_HALF = float(np.nextafter(0.5, np.inf))
+
+# (priority, {feature: (low, high)}, template); low is inclusive, high
+# exclusive. Templates are formatted with the household's features.
+SUGGESTION_RULES = [
+    (0, {"cohort_deviation": (ABOVE_HALF, np.inf)},
+     " You're using {cohort_deviation:.0%} more than the community average!"),
+
+    (1, {"eco_score": (85, np.inf)}, " Excellent work! You're in the top 10% of efficient users."),
+    (1, {"eco_score": (70, 85)}, " Good job! You're doing better than average."),
+    (1, {"eco_score": (50, 70)}, " Your usage is above average. Let's work on improving it!"),
+    (1, {"eco_score": (-np.inf, 50)}, " High energy consumption detected! Immediate action recommended."),
+
+    (2, {"trend": (0.05, np.inf)},
+     " Your usage has been rising about {trend:.0%} a month - check what changed at home recently."),
+    (2, {"trend": (-np.inf, -0.05), "eco_score": (-np.inf, 85)},
+     " Your usage is falling about {neg_trend:.0%} a month - keep going!"),
+    (3, {"seasonality": (1.3, np.inf), "eco_score": (-np.inf, 85)},
+     " Summer months cost you {seasonality:.1f}x your winter usage - cooling is the place to save."),
+    (4, {"rate": (50, np.inf)},
+     " You're paying about Rs {rate:.0f} per kWh; staying under the next tariff slab lowers the rate on every unit."),
+
+    (10, {"eco_score": (85, np.inf)}, " Consider installing smart plugs to monitor standby power consumption."),
+    (11, {"eco_score": (85, np.inf)}, " Share your energy-saving tips with the community to earn bonus points!"),
+
+    (10, {"eco_score": (70, 85)}, " Reduce AC runtime by 30 minutes daily to save ~8% energy."),
+    (11, {"eco_score": (70, 85)}, " Switch to LED bulbs if you haven't already - save up to 75% on lighting costs."),
+    (12, {"eco_score": (70, 85)}, " Use heavy appliances during off-peak hours (11 PM - 7 AM) for lower rates."),
+
+    (10, {"eco_score": (50, 70)}, " Set your AC to 24°C instead of 18°C - save up to 20% energy."),
+    (11, {"eco_score": (50, 70)}, " Unplug devices when not in use - they consume power even on standby."),
+    (12, {"eco_score": (50, 70)}, " Use washing machine and dishwasher only with full loads."),
+    (13, {"eco_score": (50, 70)}, " Replace old appliances with energy-efficient models (look for 5-star ratings)."),
+
+    (10, {"eco_score": (-np.inf, 50)}, " Check for faulty appliances or wiring - they may be consuming excess power."),
+    (11, {"eco_score": (-np.inf, 50)}, " Your AC might be the biggest culprit - service it and use it wisely."),
+    (12, {"eco_score": (-np.inf, 50)}, " Switch off lights and fans when leaving rooms."),
+    (13, {"eco_score": (-np.inf, 50)}, " Track your daily usage to identify peak consumption times."),
+    (14, {"eco_score": (-np.inf, 50)}, " Consider a home energy audit to find hidden energy drains."),
+]
+
+
+class DecisionTable:
+    """SUGGESTION_RULES compiled into bound arrays.
+
+    evaluate matches every household against every rule in one numpy
+    expression; a NaN feature (not enough history) fails any rule that
+    constrains it and is ignored by the rest.
+    """
+
+    def __init__(self, rules):
+        rules = sorted(rules, key=lambda rule: rule[0])
+        self.templates = [template for _, _, template in rules]
+        self.low = np.full((len(rules), len(FEATURES)), -np.inf)
+        self.high = np.full((len(rules), len(FEATURES)), np.inf)
+        self.constrained = np.zeros((len(rules), len(FEATURES)), dtype=bool)
+        for i, (_, conditions, _) in enumerate(rules):
+            for feature, (low, high) in conditions.items():
+                j = FEATURES.index(feature)
+                self.low[i, j] = low
+                self.high[i, j] = high
+                self.constrained[i, j] = True
+
+    def evaluate(self, features):
+        """Ranked suggestion lists for an (households, FEATURES) array."""
+        values = features[:, None, :]
+        inside = (values >= self.low) & (values < self.high)
+        matches = np.all(inside | ~self.constrained, axis=2)
+
+        results = []
+        for row, matched in zip(features, matches):
+            context = dict(zip(FEATURES, row.tolist()))
+            context["neg_trend"] = -context["trend"]
+            results.append([self.templates[i].format(**context) for i in np.flatnonzero(matched)])
+        return results
+
+
+_table = DecisionTable(SUGGESTION_RULES)
+_cache = DocumentCache(SUGGESTION_CACHE_SIZE)
+
+
+def _latest_units(data):
+    units = data.get("current_month", {}).get("units", 0)
+    if units:
+        return units
+    history = data["usage_history"]
+    return history[-1]["units"] if history else 0
+
+
+def history_features(documents, averages):
+    """(households, FEATURES) array from each document's usage history.
+
+    Histories are right-aligned into padded month matrices so trend,
+    seasonality and rate are computed for every household at once. Only
+    months within SEASON_MONTHS calendar months of the household's latest
+    one are kept, and the trend is fitted against month ordinals over the
+    last TREND_MONTHS calendar months, so gaps in a history don't stretch
+    either window.
+    """
+    count = len(documents)
+    months = np.full((count, SEASON_MONTHS), -1, dtype=np.int64)
+    units = np.full((count, SEASON_MONTHS), np.nan)
+    bill = np.full((count, SEASON_MONTHS), np.nan)
+    for i, data in enumerate(documents):
+        columns = as_history(data).columns()
+        if len(columns.months) == 0:
+            continue
+        n = len(columns.months) - np.searchsorted(columns.months, columns.months[-1] - SEASON_MONTHS + 1)
+        if n:
+            months[i, -n:] = columns.months[-n:]
+            units[i, -n:] = columns.units[-n:]
+            bill[i, -n:] = columns.bill[-n:]
+
+    features = np.full((count, len(FEATURES)), np.nan)
+    features[:, 0] = [data["eco_score"] for data in documents]
+
+    latest = np.array([_latest_units(data) for data in documents], dtype=np.float64)
+    averages = np.asarray(averages, dtype=np.float64)
+    # Short or empty histories give NaN features rather than warnings
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        features[:, 1] = np.where(averages > 0, latest / averages - 1, np.nan)
+
+        # Least-squares slope per month over the last TREND_MONTHS, relative to their mean
+        in_trend = months > months[:, -1:] - TREND_MONTHS
+        recent = np.where(in_trend, units, np.nan)
+        x = np.where(np.isnan(recent), np.nan, months.astype(np.float64))
+        x_mean = np.nanmean(x, axis=1, keepdims=True)
+        y_mean = np.nanmean(recent, axis=1, keepdims=True)
+        slope = np.nansum((x - x_mean) * (recent - y_mean), axis=1) / np.nansum((x - x_mean) ** 2, axis=1)
+        enough = np.sum(~np.isnan(recent), axis=1) >= 3
+        features[:, 2] = np.where(enough & (y_mean[:, 0] > 0), slope / y_mean[:, 0], np.nan)
+
+        summer = np.isin(months % 12, SUMMER_MONTHS) & (months >= 0)
+        summer_mean = np.nanmean(np.where(summer, units, np.nan), axis=1)
+        other_mean = np.nanmean(np.where(~summer, units, np.nan), axis=1)
+        features[:, 3] = summer_mean / other_mean
+
+        last_bill = bill[:, -1]
+        last_units = units[:, -1]
+        features[:, 4] = np.where(last_units > 0, last_bill / last_units, np.nan)
+    return features
+
+
+def data_version(data, avg_usage):
+    """Changes whenever anything the features read from data changes."""
+    return (as_history(data).version(), data["eco_score"], _latest_units(data), avg_usage)
+
+
+def suggest_batch(documents, averages):
+    """Evaluate and cache suggestions for many households in one pass."""
+    results = _table.evaluate(history_features(documents, averages))
+    for data, avg_usage, suggestions in zip(documents, averages, results):
+        _cache.put(data["user"]["name"], data_version(data, avg_usage), suggestions)
+    return results
+
+
+def get_suggestions(data, avg_usage):
+    """Ranked suggestions for one household, recomputed only when its data changes."""
+    entry = _cache.get(data["user"]["name"])
+    if entry is not None and entry[0] == data_version(data, avg_usage):
+        return entry[1]
+    return suggest_batch([data], [avg_usage])[0]
+
+
+def score_suggestions(eco_score, units_used, avg_usage):
+    """Suggestions from a score and one month's usage, without history."""
+    features = np.full((1, len(FEATURES)), np.nan)
+    features[0, 0] = eco_score
+    if avg_usage > 0:
+        features[0, 1] = units_used / avg_usage - 1
+    return _table.evaluate(features)[0]
@@ -0,0 +1,18 @@
+import pytest
+
+from bill_jobs import parse_bill_text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Address: Unit 12, Gulberg III\nUnits Consumed: 287\nAmount Payable: 6,745.50", (287, 6745.5)),
+    ("Consumption 287 kWh\nTotal Amount Rs. 6,745", (287, 6745.0)),
+    ("Units consumed (kWh): 1,250.5\nAmount due 30000", (1250.5, 30000.0)),
+    # No consumption label: the address number must not be read as usage
+    ("Address: Unit 12, Gulberg III\nTotal Bill 6745.5", (None, 6745.5)),
+    # 562 PKR per kWh is not a plausible rate
+    ("Units Consumed: 12\nAmount Payable: 6745.5", (None, 6745.5)),
+    ("Units Consumed: 0\nAmount Payable: 6745.5", (None, 6745.5)),
+    ("", (None, None)),
+])
+def test_parse_bill_text(text, expected):
+    assert parse_bill_text(text) == expected
@@ -0,0 +1,119 @@
+import json
+import threading
+
+import pytest
+
+import storage
+from storage import JsonStore
+
+
+def default_document():
+    return {
+        "user": {"name": "Hania", "household_size": 4, "location": "Lahore"},
+        "current_month": {},
+        "usage_history": [],
+        "eco_score": 0,
+        "achievements": []
+    }
+
+
+def usage_event(month, units):
+    return {
+        "month": month,
+        "units": units,
+        "bill": units * 25,
+        "date_uploaded": "2024-01-01",
+        "bill_image": None,
+        "eco_score": 70
+    }
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "user_data.json"), str(tmp_path / "usage_log.jsonl")
+
+
+def read_log(log_file):
+    with open(log_file) as f:
+        return f.read()
+
+
+def test_replay_skips_events_already_in_snapshot(paths):
+    data_file, log_file = paths
+    store = JsonStore(data_file, log_file, default_document)
+    store.append_usage(usage_event("Jan 2024", 100))
+    store.append_usage(usage_event("Feb 2024", 200))
+
+    # Crash between writing the snapshot and truncating the journal
+    data, seq, _ = store._read()
+    store._write_snapshot(data, seq)
+    with open(log_file, 'a') as f:
+        f.write(json.dumps(dict(usage_event("Feb 2024", 250), seq=seq + 1)) + "\n")
+
+    reopened, seq, pending = JsonStore(data_file, log_file, default_document)._read()
+    assert [(entry["month"], entry["units"]) for entry in reopened["usage_history"]] == [("Jan 2024", 100), ("Feb 2024", 250)]
+    assert (seq, pending) == (3, 1)
+
+
+def test_torn_final_line_is_skipped(paths):
+    data_file, log_file = paths
+    store = JsonStore(data_file, log_file, default_document)
+    store.append_usage(usage_event("Jan 2024", 100))
+    with open(log_file, 'a') as f:
+        f.write('{"month": "Feb 2024", "uni')
+
+    reopened = JsonStore(data_file, log_file, default_document).load()
+    assert [entry["month"] for entry in reopened["usage_history"]] == ["Jan 2024"]
+
+
+def test_append_after_torn_line_starts_fresh_line(paths):
+    data_file, log_file = paths
+    JsonStore(data_file, log_file, default_document).append_usage(usage_event("Jan 2024", 100))
+    with open(log_file, 'a') as f:
+        f.write('{"month": "Feb 2024", "uni')
+
+    store = JsonStore(data_file, log_file, default_document)
+    store.append_usage(usage_event("Mar 2024", 300))
+    assert read_log(log_file).splitlines()[-1].startswith("{")
+
+    reopened = JsonStore(data_file, log_file, default_document).load()
+    assert [entry["month"] for entry in reopened["usage_history"]] == ["Jan 2024", "Mar 2024"]
+
+
+def test_compaction_requested_at_threshold(paths, monkeypatch):
+    data_file, log_file = paths
+    monkeypatch.setattr(storage, "COMPACT_THRESHOLD", 3)
+    store = JsonStore(data_file, log_file, default_document)
+    requests = []
+    monkeypatch.setattr(store, "_request_compaction", lambda: requests.append(len(read_log(log_file).splitlines())))
+
+    for month in ("Jan 2024", "Feb 2024", "Mar 2024"):
+        store.append_usage(usage_event(month, 100))
+    assert requests == [3]
+
+    store.compact()
+    assert read_log(log_file) == ""
+    reopened = JsonStore(data_file, log_file, default_document).load()
+    assert len(reopened["usage_history"]) == 3
+    with open(data_file) as f:
+        assert json.load(f)["_log_seq"] == 3
+
+
+def test_append_waits_for_another_process_rewrite(paths):
+    data_file, log_file = paths
+    app = JsonStore(data_file, log_file, default_document)
+    cli = JsonStore(data_file, log_file, default_document)
+    app.append_usage(usage_event("Jan 2024", 100))
+
+    appended = threading.Event()
+    writer = threading.Thread(target=lambda: (app.append_usage(usage_event("Feb 2024", 200)), appended.set()))
+    with cli._writing():
+        data, seq, _ = cli._read()
+        writer.start()
+        assert not appended.wait(0.2)
+        cli._write_snapshot(data, seq)
+        cli._truncate_log()
+    writer.join()
+
+    reopened = JsonStore(data_file, log_file, default_document).load()
+    assert [entry["month"] for entry in reopened["usage_history"]] == ["Jan 2024", "Feb 2024"]
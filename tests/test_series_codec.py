@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from series_codec import BLOCK_SIZE, block_summary, decode_block, encode_block
+
+
+def roundtrip(timestamps, values):
+    decoded_t, decoded_v = decode_block(encode_block(timestamps, values))
+    np.testing.assert_array_equal(decoded_t, np.asarray(timestamps, dtype=np.int64))
+    np.testing.assert_array_equal(decoded_v.view(np.uint64), np.asarray(values, dtype=np.float64).view(np.uint64))
+
+
+@pytest.mark.parametrize("dod", [0, 1, -1, 63, 64, -64, 65, -65, 255, 256, -256, 257,
+                                 2047, 2048, -2048, 2049, -2049, 2 ** 40, -(2 ** 40)])
+def test_bucket_boundary_dods(dod):
+    timestamps = np.cumsum([0, 900, 900 + dod, 900, 900 - dod])
+    roundtrip(timestamps, [0.1, 0.2, 0.2, 0.35, 0.0])
+
+
+def test_overflow_bucket():
+    timestamps = [0, 1, 2 ** 61, 2 ** 61 + 1, -(2 ** 61)]
+    roundtrip(timestamps, [1.0, 2.0, 3.0, 4.0, 5.0])
+
+
+def test_special_values():
+    roundtrip([0, 900, 1800, 2700, 3600], [np.nan, -0.0, np.inf, 1e-300, -np.inf])
+
+
+def test_single_reading():
+    roundtrip([1704067200], [0.25])
+
+
+def test_jittered_blocks():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        timestamps = 1704067200 + np.cumsum(900 + rng.integers(-3000, 3000, BLOCK_SIZE))
+        values = np.round(rng.gamma(2, 0.15, BLOCK_SIZE), 3)
+        roundtrip(timestamps, values)
+
+
+def test_block_summary():
+    timestamps = np.array([10, 20, 30])
+    values = np.array([0.5, 0.25, 1.0])
+    assert block_summary(timestamps, values) == (10, 30, 3, 0.25, 1.0, 1.75)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from history import month_label
+from suggestions import FEATURES, SEASON_MONTHS, history_features
+
+TREND = FEATURES.index("trend")
+SEASONALITY = FEATURES.index("seasonality")
+
+
+def document(entries):
+    return {
+        "eco_score": 70,
+        "current_month": {},
+        "usage_history": [{"month": month_label(key), "units": units, "bill": units * 25} for key, units in entries]
+    }
+
+
+def test_trend_is_per_calendar_month():
+    start = 2024 * 12
+    steady = document([(start + i, 300 + 10 * i) for i in range(6)])
+    features = history_features([steady], [300])
+    assert features[0, TREND] == pytest.approx(10 / 325)
+
+
+def test_yearly_entries_are_outside_the_trend_window():
+    yearly = document([(2022 * 12, 300), (2023 * 12, 330), (2024 * 12, 360)])
+    assert np.isnan(history_features([yearly], [300])[0, TREND])
+
+
+def test_season_window_ignores_old_months():
+    latest = 2024 * 12 + 11
+    entries = [(latest - SEASON_MONTHS - 6, 900)] + [(latest - i, 300) for i in range(12)]
+    features = history_features([document(entries)], [300])
+    assert features[0, SEASONALITY] == pytest.approx(1.0)
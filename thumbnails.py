@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import BILLS_FOLDER, BILL_CHUNK_SIZE, get_bill_image_path
+
+THUMBNAIL_FOLDER = os.path.join(BILLS_FOLDER, "thumbnails")
+THUMBNAIL_SIZE = (320, 320)
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png"}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ecometer-thumbnails")
+_lock = threading.RLock()
+_pending = {}
+_missing = set()
+_known = None
+_legacy_hashes = {}
+
+
+def _source_hash(filename):
+    if not filename.startswith("bill_"):
+        return filename.rsplit('.', 1)[0]
+
+    # Legacy uploads aren't content-addressed; hash them once per process
+    if filename not in _legacy_hashes:
+        digest = hashlib.sha256()
+        with open(get_bill_image_path(filename), 'rb') as f:
+            for chunk in iter(lambda: f.read(BILL_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _legacy_hashes[filename] = digest.hexdigest()
+    return _legacy_hashes[filename]
+
+
+def _thumbnail_name(source_hash):
+    return f"{source_hash}_{THUMBNAIL_SIZE[0]}.jpg"
+
+
+def _thumbnail_path(source_hash):
+    return os.path.join(THUMBNAIL_FOLDER, source_hash[:2], _thumbnail_name(source_hash))
+
+
+def _known_thumbnails():
+    # Listed once per process; afterwards kept up to date by the workers
+    global _known
+    if _known is None:
+        known = set()
+        for _, _, files in os.walk(THUMBNAIL_FOLDER):
+            known.update(files)
+        _known = known
+    return _known
+
+
+def _generate(source_path, source_hash):
+    from PIL import Image
+
+    target = _thumbnail_path(source_hash)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Image.open(source_path) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        tmp_target = target + ".part"
+        image.convert("RGB").save(tmp_target, "JPEG", quality=80)
+    os.replace(tmp_target, target)
+    return target
+
+
+def _on_done(source_hash, future):
+    with _lock:
+        _pending.pop(source_hash, None)
+        if future.exception() is None:
+            _known_thumbnails().add(_thumbnail_name(source_hash))
+        else:
+            _missing.add(source_hash)
+
+
+def get_thumbnail(filename):
+    """Return (status, path) for a bill's thumbnail.
+
+    status is "ready", "pending" (queued for the background pool),
+    "missing" (source file unreadable) or "unsupported" (e.g. PDFs).
+    """
+    if filename.rsplit('.', 1)[-1].lower() not in IMAGE_EXTENSIONS:
+        return "unsupported", None
+
+    try:
+        source_hash = _source_hash(filename)
+    except OSError:
+        return "missing", None
+
+    with _lock:
+        if _thumbnail_name(source_hash) in _known_thumbnails():
+            return "ready", _thumbnail_path(source_hash)
+        if source_hash in _missing:
+            return "missing", None
+        if source_hash not in _pending:
+            future = _executor.submit(_generate, get_bill_image_path(filename), source_hash)
+            _pending[source_hash] = future
+            future.add_done_callback(lambda f: _on_done(source_hash, f))
+    return "pending", None
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from history import month_label
+from series_codec import BLOCK_SIZE, block_summary, decode_block, encode_block
+from storage import DocumentCache, _stat_token
+
+READING_DTYPE = np.dtype([("t", "<i8"), ("kwh", "<f8")])
+# One entry per sealed block in blocks.bin
+BLOCK_INDEX_DTYPE = np.dtype([
+    ("offset", "<i8"), ("length", "<i8"),
+    ("t_min", "<i8"), ("t_max", "<i8"), ("count", "<i8"),
+    ("v_min", "<f8"), ("v_max", "<f8"), ("v_sum", "<f8")
+])
+ROLLUP_RESOLUTIONS = ("hour", "day", "month")
+
+
+def bucket_starts(timestamps, resolution):
+    """Rollup bucket for each epoch-second timestamp.
+
+    Hours and days are epoch seconds of the bucket start; months are
+    ordinals as in history.month_key, so they line up with usage_history.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if resolution == "hour":
+        return timestamps - timestamps % 3600
+    if resolution == "day":
+        return timestamps - timestamps % 86400
+    if resolution == "month":
+        return timestamps.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64) + 1970 * 12
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+
+def month_span(month):
+    """(start, end) epoch seconds of a month ordinal from bucket_starts."""
+    months = np.array([month, month + 1]) - 1970 * 12
+    start, end = months.astype("datetime64[M]").astype("datetime64[s]").astype(np.int64)
+    return int(start), int(end)
+
+
+def _merge(starts, sums, counts, new_starts, new_sums, new_counts):
+    merged, inverse = np.unique(np.concatenate([starts, new_starts]), return_inverse=True)
+    return (
+        merged,
+        np.bincount(inverse, weights=np.concatenate([sums, new_sums]), minlength=len(merged)),
+        np.bincount(inverse, weights=np.concatenate([counts, new_counts]), minlength=len(merged)).astype(np.int64)
+    )
+
+
+class MeterStore:
+    """Per-household interval readings with hourly/daily/monthly rollups.
+
+    Every BLOCK_SIZE readings are sealed into a compressed block appended
+    to blocks.bin (see series_codec); newer readings wait in an
+    uncompressed tail file as fixed-size (t, kwh) records. rollups.npz
+    holds kWh sums and reading counts per bucket, the block index with
+    each block's min/max/sum, and the reading count and tail file it
+    covers. It is rewritten atomically after each append and is the
+    commit point: block bytes and tail records past what it covers are
+    from an interrupted append and are cut off before the next one.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.cache = DocumentCache()
+        self._lock = threading.Lock()
+
+    def _household_folder(self, household):
+        return os.path.join(self.folder, hashlib.sha256(household.encode("utf-8")).hexdigest()[:16])
+
+    def _paths(self, household):
+        folder = self._household_folder(household)
+        return os.path.join(folder, "blocks.bin"), os.path.join(folder, "rollups.npz")
+
+    def _tail_path(self, household, generation):
+        # Sealing writes the remaining tail to a new file, so the old one stays
+        # valid until rollups.npz points past it
+        name = "readings.bin" if generation == 0 else f"readings-{generation}.bin"
+        return os.path.join(self._household_folder(household), name)
+
+    def _empty_rollups(self):
+        rollups = {
+            "records": 0,
+            "last_t": np.iinfo(np.int64).min,
+            "blocks": np.empty(0, dtype=BLOCK_INDEX_DTYPE),
+            "generation": 0
+        }
+        for resolution in ROLLUP_RESOLUTIONS:
+            rollups[resolution] = (np.empty(0, np.int64), np.empty(0, np.float64), np.empty(0, np.int64))
+        return rollups
+
+    def _load_rollups(self, household):
+        _, rollups_path = self._paths(household)
+        token = _stat_token(rollups_path)
+        entry = self.cache.get(household)
+        if entry is not None and entry[0] == token:
+            return entry[1]
+        if token is None:
+            return self._empty_rollups()
+
+        with np.load(rollups_path) as stored:
+            rollups = {"records": int(stored["records"]), "last_t": int(stored["last_t"])}
+            # Stores written before blocks existed keep everything in readings.bin
+            rollups["blocks"] = stored["blocks"] if "blocks" in stored.files else np.empty(0, dtype=BLOCK_INDEX_DTYPE)
+            rollups["generation"] = int(stored["generation"]) if "generation" in stored.files else 0
+            for resolution in ROLLUP_RESOLUTIONS:
+                rollups[resolution] = tuple(stored[f"{resolution}_{part}"] for part in ("t", "kwh", "n"))
+        self.cache.put(household, token, rollups)
+        return rollups
+
+    def _save_rollups(self, household, rollups):
+        _, rollups_path = self._paths(household)
+        arrays = {key: rollups[key] for key in ("records", "last_t", "blocks", "generation")}
+        for resolution in ROLLUP_RESOLUTIONS:
+            for part, values in zip(("t", "kwh", "n"), rollups[resolution]):
+                arrays[f"{resolution}_{part}"] = values
+        tmp_path = rollups_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, rollups_path)
+        self.cache.put(household, _stat_token(rollups_path), rollups)
+
+    def append(self, household, timestamps, kwh):
+        """Append readings newer than the household's last one.
+
+        Returns (appended, skipped, month ordinals touched). Readings at or
+        before the last stored timestamp are skipped, so re-ingesting an
+        overlapping file doesn't double count.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        kwh = np.asarray(kwh, dtype=np.float64)
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, kwh = timestamps[order], kwh[order]
+        # The last reading wins when a batch repeats a timestamp
+        last_of_run = np.append(timestamps[1:] != timestamps[:-1], True)
+        timestamps, kwh = timestamps[last_of_run], kwh[last_of_run]
+
+        with self._lock:
+            rollups = self._load_rollups(household)
+            fresh = timestamps > rollups["last_t"]
+            skipped = len(order) - int(fresh.sum())
+            timestamps, kwh = timestamps[fresh], kwh[fresh]
+            if len(timestamps) == 0:
+                return 0, skipped, []
+
+            os.makedirs(self._household_folder(household), exist_ok=True)
+            records = np.empty(len(timestamps), dtype=READING_DTYPE)
+            records["t"] = timestamps
+            records["kwh"] = kwh
+
+            blocks, generation = rollups["blocks"], rollups["generation"]
+            tail = self._read_tail(household, rollups)
+            pending = np.concatenate([tail, records])
+            sealed = len(pending) // BLOCK_SIZE * BLOCK_SIZE
+            if sealed:
+                blocks = np.concatenate([blocks, self._seal(household, blocks, pending[:sealed])])
+                generation += 1
+                with open(self._tail_path(household, generation), 'wb') as f:
+                    f.write(pending[sealed:].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            else:
+                with open(self._tail_path(household, generation), 'ab') as f:
+                    f.truncate(len(tail) * READING_DTYPE.itemsize)
+                    f.write(records.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            updated = {
+                "records": rollups["records"] + len(records),
+                "last_t": int(timestamps[-1]),
+                "blocks": blocks,
+                "generation": generation
+            }
+            for resolution in ROLLUP_RESOLUTIONS:
+                starts, inverse = np.unique(bucket_starts(timestamps, resolution), return_inverse=True)
+                updated[resolution] = _merge(
+                    *rollups[resolution],
+                    starts,
+                    np.bincount(inverse, weights=kwh, minlength=len(starts)),
+                    np.bincount(inverse, minlength=len(starts))
+                )
+            self._save_rollups(household, updated)
+            if generation != rollups["generation"]:
+                try:
+                    os.remove(self._tail_path(household, rollups["generation"]))
+                except FileNotFoundError:
+                    pass
+            return len(records), skipped, np.unique(bucket_starts(timestamps, "month")).tolist()
+
+    def _read_tail(self, household, rollups):
+        count = rollups["records"] - int(rollups["blocks"]["count"].sum())
+        if count == 0:
+            return np.empty(0, dtype=READING_DTYPE)
+        return np.fromfile(self._tail_path(household, rollups["generation"]), dtype=READING_DTYPE, count=count)
+
+    def _seal(self, household, blocks, records):
+        """Encode records into BLOCK_SIZE blocks appended to blocks.bin; returns their index entries."""
+        blocks_path, _ = self._paths(household)
+        offset = int(blocks["offset"][-1] + blocks["length"][-1]) if len(blocks) else 0
+        entries = np.empty(len(records) // BLOCK_SIZE, dtype=BLOCK_INDEX_DTYPE)
+        with open(blocks_path, 'ab') as f:
+            f.truncate(offset)
+            for i in range(len(entries)):
+                block = records[i * BLOCK_SIZE:(i + 1) * BLOCK_SIZE]
+                data = encode_block(block["t"], block["kwh"])
+                f.write(data)
+                entries[i] = (offset, len(data)) + block_summary(block["t"], block["kwh"])
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return entries
+
+    def _decode(self, household, entries):
+        """(timestamps, kWh) for each block index entry, read from blocks.bin."""
+        if len(entries) == 0:
+            return
+        blocks_path, _ = self._paths(household)
+        with open(blocks_path, 'rb') as f:
+            for entry in entries:
+                f.seek(int(entry["offset"]))
+                yield decode_block(f.read(int(entry["length"])))
+
+    def _span(self, household, start, end):
+        """Index entries of blocks overlapping [start, end), whether each lies wholly inside, and the tail."""
+        rollups = self._load_rollups(household)
+        blocks = rollups["blocks"]
+        start = np.iinfo(np.int64).min if start is None else start
+        end = np.iinfo(np.int64).max if end is None else end
+        overlapping = blocks[(blocks["t_max"] >= start) & (blocks["t_min"] < end)]
+        inside = (overlapping["t_min"] >= start) & (overlapping["t_max"] < end)
+        return overlapping, inside, self._read_tail(household, rollups), start, end
+
+    def readings(self, household, start=None, end=None):
+        """(timestamps, kWh) of raw readings with start <= t < end.
+
+        Only blocks overlapping the range are read and decompressed.
+        """
+        overlapping, _, tail, start, end = self._span(household, start, end)
+        parts = list(self._decode(household, overlapping)) + [(tail["t"], tail["kwh"])]
+        timestamps = np.concatenate([t for t, _ in parts])
+        kwh = np.concatenate([v for _, v in parts])
+        wanted = (timestamps >= start) & (timestamps < end)
+        return timestamps[wanted], kwh[wanted]
+
+    def aggregate(self, household, start=None, end=None):
+        """{"count", "sum", "min", "max"} of kWh readings with start <= t < end.
+
+        Blocks wholly inside the range are answered from their index
+        summaries and blocks outside it are skipped; only the (at most two)
+        blocks straddling an edge, plus the tail, are decompressed.
+        """
+        overlapping, inside, tail, start, end = self._span(household, start, end)
+        whole = overlapping[inside]
+        count = int(whole["count"].sum())
+        total = float(whole["v_sum"].sum())
+        lows, highs = list(whole["v_min"]), list(whole["v_max"])
+
+        for timestamps, kwh in list(self._decode(household, overlapping[~inside])) + [(tail["t"], tail["kwh"])]:
+            kwh = kwh[(timestamps >= start) & (timestamps < end)]
+            if len(kwh):
+                count += len(kwh)
+                total += float(kwh.sum())
+                lows.append(kwh.min())
+                highs.append(kwh.max())
+        return {
+            "count": count,
+            "sum": total,
+            "min": float(min(lows)) if lows else None,
+            "max": float(max(highs)) if highs else None
+        }
+
+    def rollup(self, household, resolution, start=None, end=None):
+        """(bucket starts, kWh sums, reading counts) with start <= bucket < end."""
+        starts, sums, counts = self._load_rollups(household)[resolution]
+        lo = 0 if start is None else np.searchsorted(starts, start)
+        hi = len(starts) if end is None else np.searchsorted(starts, end)
+        return starts[lo:hi], sums[lo:hi], counts[lo:hi]
+
+    def monthly_usage(self, household, months=None):
+        """[(month label, kWh)] from the monthly rollup, optionally only for given ordinals."""
+        starts, sums, _ = self.rollup(household, "month")
+        wanted = None if months is None else set(months)
+        return [
+            (month_label(int(start)), float(total))
+            for start, total in zip(starts, sums)
+            if wanted is None or int(start) in wanted
+        ]
+
+    def covers_month(self, household, month):
+        """Whether every interval of the month has a reading.
+
+        The interval is the household's usual spacing between readings, so
+        a month with dropped readings or that is still in progress isn't
+        covered.
+        """
+        start, end = month_span(month)
+        timestamps, _ = self.readings(household, start, end)
+        if len(timestamps) < 2:
+            return False
+        interval = int(np.median(np.diff(timestamps)))
+        return len(timestamps) >= (end - start) // interval
+
+    def version(self, household):
+        """Changes whenever readings are appended for household."""
+        rollups = self._load_rollups(household)
+        return (rollups["records"], rollups["last_t"])
+
+    def has_readings(self, household):
+        return self._load_rollups(household)["records"] > 0
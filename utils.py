@@ -1,21 +1,72 @@
-import json
+import hashlib
 import os
+import tempfile
+import zlib
 from datetime import datetime, timedelta
-import random
 import shutil
+import threading
+from itertools import islice
+import numpy as np
+from storage import JsonStore, SqliteStore
+from timeseries import MeterStore
+from community import CommunityStats, DEFAULT_COMMUNITY_AVERAGE
+from rankings import Leaderboard
+from challenges import current_period, join_challenge, participant_count, scheduled_challenge
+from achievements import backfill_if_rules_changed, event_metrics, new_achievements
+from suggestions import PRECOMPUTE_BATCH, SUGGESTION_CACHE_SIZE, score_suggestions, suggest_batch, get_suggestions as get_cached_suggestions
 
 DATA_FILE = "user_data.json"
+USAGE_LOG_FILE = "usage_log.jsonl"
+DATABASE_FILE = os.path.join("backend", "ecometer.db")
+COMMUNITY_STATS_FILE = "community_stats.json"
 BILLS_FOLDER = "uploaded_bills"
+BILL_CHUNK_SIZE = 1024 * 1024
+METER_FOLDER = "meter_data"
+ACHIEVEMENT_RULES_FILE = "achievement_rules.version"
 
-def load_user_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    return initialize_default_data()
+# "json" keeps the single-household user_data.json; "sqlite" serves every
+# household from backend/ecometer.db, keyed by username.
+STORAGE_BACKEND = os.environ.get("ECOMETER_STORAGE", "json")
+DEFAULT_USER = os.environ.get("ECOMETER_USER", "Hania")
 
-def save_user_data(data):
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+_store = None
+_community_stats = None
+_leaderboard = None
+_meter_store = None
+_suggestion_precompute = None
+_achievement_backfill = None
+
+def get_store():
+    global _store
+    if _store is None:
+        if STORAGE_BACKEND == "sqlite":
+            _store = SqliteStore(DATABASE_FILE, DEFAULT_USER)
+        elif STORAGE_BACKEND == "json":
+            _store = JsonStore(DATA_FILE, USAGE_LOG_FILE, initialize_default_data)
+        else:
+            raise ValueError(f"Unknown ECOMETER_STORAGE backend: {STORAGE_BACKEND}")
+    return _store
+
+def get_meter_store():
+    global _meter_store
+    if _meter_store is None:
+        _meter_store = MeterStore(METER_FOLDER)
+    return _meter_store
+
+def get_community_stats():
+    global _community_stats
+    if _community_stats is None:
+        _community_stats = CommunityStats.load_or_rebuild(COMMUNITY_STATS_FILE, get_store())
+    return _community_stats
+
+def get_community_average(location=None, household_size=None):
+    return get_community_stats().average(location, household_size)
+
+def load_user_data(user_id=None):
+    return get_store().load(user_id)
+
+def save_user_data(data, user_id=None):
+    get_store().save(data, user_id)
 
 def initialize_default_data():
     return {
@@ -40,54 +91,72 @@ def initialize_default_data():
         "challenges_completed": 0
     }
 
-def calculate_eco_score(units_used, household_size=4):
+def score_key(household, month):
+    # Stable per household and month, so re-scoring gives the same jitter
+    return zlib.crc32(f"{household}|{month}".encode("utf-8"))
+
+def _score_jitter(keys, shape, seed=None):
+    if keys is None:
+        return np.random.default_rng(seed).integers(0, 6, size=shape)
+    # splitmix64 finalizer spreads nearby keys over the 0-5 jitter range
+    with np.errstate(over='ignore'):
+        z = np.asarray(keys, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return np.broadcast_to((z % np.uint64(6)).astype(np.int64), shape)
+
+def calculate_eco_scores(units_used, household_size=4, keys=None, seed=None):
+    units, household_size = np.broadcast_arrays(
+        np.asarray(units_used, dtype=np.float64),
+        np.asarray(household_size, dtype=np.float64)
+    )
     avg_per_person = 75
     expected_usage = avg_per_person * household_size
-    if units_used <= expected_usage * 0.7:  
-        score = 95 + random.randint(0, 5)
-    elif units_used <= expected_usage:  
-        score = 80 + int((expected_usage - units_used) / expected_usage * 15)
-    elif units_used <= expected_usage * 1.3:  
-        score = 60 + int((1 - (units_used - expected_usage) / (expected_usage * 0.3)) * 20)
-    else:  
-        score = max(30, 60 - int((units_used - expected_usage * 1.3) / expected_usage * 30))
-    return min(100, max(0, score))
-
-def get_ai_suggestion(eco_score, units_used, avg_usage=300):
-    suggestions = []
-    if eco_score >= 85:
-        suggestions = [
-            " Excellent work! You're in the top 10% of efficient users.",
-            " Consider installing smart plugs to monitor standby power consumption.",
-            " Share your energy-saving tips with the community to earn bonus points!"
-        ]
-    elif eco_score >= 70:
-        suggestions = [
-            " Good job! You're doing better than average.",
-            " Reduce AC runtime by 30 minutes daily to save ~8% energy.",
-            " Switch to LED bulbs if you haven't already - save up to 75% on lighting costs.",
-            " Use heavy appliances during off-peak hours (11 PM - 7 AM) for lower rates."
-        ]
-    elif eco_score >= 50:
-        suggestions = [
-            " Your usage is above average. Let's work on improving it!",
-            " Set your AC to 24°C instead of 18°C - save up to 20% energy.",
-            " Unplug devices when not in use - they consume power even on standby.",
-            " Use washing machine and dishwasher only with full loads.",
-            " Replace old appliances with energy-efficient models (look for 5-star ratings)."
-        ]
-    else:
-        suggestions = [
-            " High energy consumption detected! Immediate action recommended.",
-            " Check for faulty appliances or wiring - they may be consuming excess power.",
-            " Your AC might be the biggest culprit - service it and use it wisely.",
-            " Switch off lights and fans when leaving rooms.",
-            " Track your daily usage to identify peak consumption times.",
-            " Consider a home energy audit to find hidden energy drains."
-        ]
-    if units_used > avg_usage * 1.5:
-        suggestions.insert(0, f" You're using {int((units_used/avg_usage - 1) * 100)}% more than the community average!")
-    return suggestions
+    jitter = _score_jitter(keys, units.shape, seed)
+    score = np.select(
+        [
+            units <= expected_usage * 0.7,
+            units <= expected_usage,
+            units <= expected_usage * 1.3
+        ],
+        [
+            95 + jitter,
+            80 + np.trunc((expected_usage - units) / expected_usage * 15),
+            60 + np.trunc((1 - (units - expected_usage) / (expected_usage * 0.3)) * 20)
+        ],
+        default=np.maximum(30, 60 - np.trunc((units - expected_usage * 1.3) / expected_usage * 30))
+    )
+    return np.clip(score, 0, 100).astype(np.int64)
+
+def calculate_eco_score(units_used, household_size=4, key=None):
+    keys = None if key is None else [key]
+    return int(calculate_eco_scores([units_used], [household_size], keys)[0])
+
+def get_ai_suggestion(eco_score, units_used, avg_usage=DEFAULT_COMMUNITY_AVERAGE):
+    return score_suggestions(eco_score, units_used, avg_usage)
+
+def get_suggestions(data):
+    """Ranked suggestions for a household document, cached per data version."""
+    _start_suggestion_precompute()
+    return get_cached_suggestions(data, get_community_average(data["user"]["location"]))
+
+def precompute_suggestions():
+    # Warms the cache PRECOMPUTE_BATCH households at a time, only as many
+    # as it holds, so documents are never all in memory at once
+    profiles = islice(get_store().iter_profiles(), SUGGESTION_CACHE_SIZE)
+    while True:
+        names = [name for name, _, _, _ in islice(profiles, PRECOMPUTE_BATCH)]
+        if not names:
+            break
+        documents = [get_store().load(name) for name in names]
+        suggest_batch(documents, [get_community_average(data["user"]["location"]) for data in documents])
+
+def _start_suggestion_precompute():
+    global _suggestion_precompute
+    if _suggestion_precompute is None:
+        _suggestion_precompute = threading.Thread(target=precompute_suggestions, name="ecometer-suggestions", daemon=True)
+        _suggestion_precompute.start()
 
 def get_community_leaderboard():
     users = [
@@ -102,104 +171,121 @@ def get_community_leaderboard():
     ]
     return users
 
-def get_comparison_stats(user_units, household_size=4):
-    avg_usage = 300
-    percentile = max(0, min(100, int((1 - (user_units - avg_usage) / avg_usage) * 50 + 50)))
+def _leaderboard_record(name, eco_score, location, savings="N/A"):
+    return {"name": name, "eco_score": eco_score, "savings": savings, "location": location}
+
+def get_leaderboard_index():
+    # Built once per process from the community list and stored households,
+    # then kept current by add_usage_entry.
+    global _leaderboard
+    if _leaderboard is None:
+        leaderboard = Leaderboard()
+        for user in get_community_leaderboard():
+            leaderboard.upsert(dict(user))
+        for name, location, _, eco_score in get_store().iter_profiles():
+            if eco_score > 0:
+                leaderboard.upsert(_leaderboard_record(name, eco_score, location))
+        _leaderboard = leaderboard
+    return _leaderboard
+
+def get_comparison_stats(user_units, household_size=4, location=None):
+    stats = get_community_stats()
+    avg_usage = stats.average(location)
+    efficient_usage = stats.efficient_threshold(location)
     comparison = {
         "your_usage": user_units,
         "community_avg": avg_usage,
         "difference": user_units - avg_usage,
         "difference_percent": round((user_units - avg_usage) / avg_usage * 100, 1),
-        "percentile": percentile,
-        "similar_households_avg": avg_usage + random.randint(-20, 20),
-        "efficient_households_avg": int(avg_usage * 0.7),
-        "potential_savings": max(0, user_units - int(avg_usage * 0.7))
+        "percentile": stats.efficiency_percentile(user_units, location),
+        "similar_households_avg": stats.average(location, household_size),
+        "efficient_households_avg": efficient_usage,
+        "potential_savings": max(0, user_units - efficient_usage)
     }
     return comparison
 
 def get_monthly_challenge():
-    challenges = [
-        {
-            "title": "AC Efficiency Challenge",
-            "description": "Keep your AC at 24°C or higher for the entire month",
-            "reward": "+10 EcoScore points",
-            "participants": 156
-        },
-        {
-            "title": "Peak Hour Saver",
-            "description": "Reduce usage during peak hours (6 PM - 11 PM) by 20%",
-            "reward": "+15 EcoScore points",
-            "participants": 203
-        },
-        {
-            "title": "Zero Standby Week",
-            "description": "Unplug all devices when not in use for 7 days",
-            "reward": "+8 EcoScore points",
-            "participants": 89
-        }
-    ]
-    return random.choice(challenges)
+    period = current_period()
+    return dict(scheduled_challenge(period), participants=participant_count(period))
+
+def join_monthly_challenge(user_id=None):
+    """True if the household joined just now, False if it already had."""
+    return join_challenge(load_user_data(user_id)["user"]["name"])
 
 def save_bill_image(uploaded_file):
-    if not os.path.exists(BILLS_FOLDER):
-        os.makedirs(BILLS_FOLDER)
+    # Bills are stored by SHA-256 of their content, so re-uploading the same
+    # bill reuses the existing file. Copied in fixed-size chunks.
+    os.makedirs(BILLS_FOLDER, exist_ok=True)
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = uploaded_file.name.split('.')[-1]
-    filename = f"bill_{timestamp}.{file_extension}"
-    filepath = os.path.join(BILLS_FOLDER, filename)
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=BILLS_FOLDER, suffix=".part")
     
-    with open(filepath, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    uploaded_file.seek(0)
+    with os.fdopen(fd, "wb") as f:
+        for chunk in iter(lambda: uploaded_file.read(BILL_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            f.write(chunk)
+    
+    filename = f"{digest.hexdigest()}.{file_extension}"
+    filepath = get_bill_image_path(filename)
+    if os.path.exists(filepath):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        os.replace(tmp_path, filepath)
     
     return filename
 
-def add_usage_entry(units, bill, bill_image_filename=None):
-    data = load_user_data()
+def add_usage_entry(units, bill, bill_image_filename=None, user_id=None, eco_score=None):
+    data = load_user_data(user_id)
     
-    data["current_month"] = {
+    month = datetime.now().strftime("%b %Y")
+    if eco_score is None:
+        eco_score = calculate_eco_score(units, data["user"]["household_size"], score_key(data["user"]["name"], month))
+    
+    event = {
+        "month": month,
         "units": units,
         "bill": bill,
         "date_uploaded": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "bill_image": bill_image_filename
+        "bill_image": bill_image_filename,
+        "eco_score": eco_score
     }
+    metrics = event_metrics(data, event)
+    new_month = metrics["months_tracked"] > len(data["usage_history"])
+    # Badges are decided once, here, and travel with the event
+    event["achievements"] = new_achievements(data, metrics)
     
-    data["eco_score"] = calculate_eco_score(units, data["user"]["household_size"])
-    
-    current_month = datetime.now().strftime("%b %Y")
-    if not any(entry["month"] == current_month for entry in data["usage_history"]):
-        data["usage_history"].append({
-            "month": current_month,
-            "units": units,
-            "bill": bill,
-            "bill_image": bill_image_filename
-        })
-    else:
-        for entry in data["usage_history"]:
-            if entry["month"] == current_month:
-                entry["units"] = units
-                entry["bill"] = bill
-                entry["bill_image"] = bill_image_filename
-                break
-    
-    save_user_data(data)
+    # Only the event is written; the snapshot is folded in by the compactor
+    data = get_store().append_usage(event, user_id)
+    if new_month:
+        # A resubmitted month is a correction; CommunityStats.rebuild picks those up
+        get_community_stats().record(data["user"]["location"], data["user"]["household_size"], units)
+    if _leaderboard is not None:
+        _leaderboard.upsert(_leaderboard_record(data["user"]["name"], data["eco_score"], data["user"]["location"]))
     return data
 
 def get_bill_image_path(filename):
     if filename:
-        return os.path.join(BILLS_FOLDER, filename)
+        # Uploads from before content addressing live flat as bill_<timestamp>.<ext>
+        if filename.startswith("bill_"):
+            return os.path.join(BILLS_FOLDER, filename)
+        return os.path.join(BILLS_FOLDER, filename[:2], filename[2:4], filename)
     return None
 
-def get_achievements(eco_score, total_months):
-    achievements = []
-    
-    if eco_score >= 90:
-        achievements.append({"icon": "🏆", "title": "Eco Champion", "desc": "EcoScore above 90"})
-    if eco_score >= 80:
-        achievements.append({"icon": "🌟", "title": "Energy Star", "desc": "EcoScore above 80"})
-    if total_months >= 3:
-        achievements.append({"icon": "📅", "title": "Consistent Tracker", "desc": "3+ months of data"})
-    if total_months >= 6:
-        achievements.append({"icon": "🎯", "title": "Long-term Saver", "desc": "6+ months of tracking"})
-    
-    return achievements
+def get_achievements(data):
+    """Earned badges, as persisted by add_usage_entry and the backfill."""
+    _start_achievement_backfill()
+    return data.get("achievements", [])
+
+def _start_achievement_backfill():
+    # Checked once per process; only rules changed since the last backfill
+    # cost a scan of every household
+    global _achievement_backfill
+    if _achievement_backfill is None:
+        _achievement_backfill = threading.Thread(
+            target=backfill_if_rules_changed, args=(get_store(), ACHIEVEMENT_RULES_FILE),
+            name="ecometer-achievement-backfill", daemon=True
+        )
+        _achievement_backfill.start()
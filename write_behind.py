@@ -0,0 +1,97 @@
+import atexit
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from utils import add_usage_entry, calculate_eco_score, load_user_data, score_key
+
+# Submissions for the same household inside this window collapse into one write
+COALESCE_SECONDS = 0.25
+MAX_TICKETS = 1000
+
+_cond = threading.Condition()
+_pending = {}
+_tickets = OrderedDict()
+_writer = None
+
+
+def submit_usage(units, bill, bill_image_filename=None, user_id=None):
+    """Score a submission in memory and queue it for the background writer.
+
+    Returns (eco_score, ticket); poll get_write_status(ticket) to learn when
+    the entry is durable.
+    """
+    data = load_user_data(user_id)
+    month = datetime.now().strftime("%b %Y")
+    eco_score = calculate_eco_score(units, data["user"]["household_size"], score_key(data["user"]["name"], month))
+    ticket = uuid.uuid4().hex
+
+    with _cond:
+        previous = _pending.get(user_id)
+        if previous is not None:
+            _tickets[previous[0]] = ("coalesced", ticket)
+        _pending[user_id] = (ticket, units, bill, bill_image_filename, eco_score)
+        _set_status(ticket, ("pending", None))
+        _start_writer()
+        _cond.notify_all()
+    return eco_score, ticket
+
+
+def get_write_status(ticket):
+    """Return "pending", "saved", "failed", or None for an unknown ticket."""
+    with _cond:
+        status = _tickets.get(ticket)
+        # A coalesced submission is durable once the one that replaced it is
+        while status is not None and status[0] == "coalesced":
+            status = _tickets.get(status[1])
+        return status[0] if status else None
+
+
+def flush(timeout=5.0):
+    deadline = time.monotonic() + timeout
+    with _cond:
+        while _pending and time.monotonic() < deadline:
+            _cond.wait(deadline - time.monotonic())
+
+
+def _set_status(ticket, status):
+    _tickets[ticket] = status
+    _tickets.move_to_end(ticket)
+    while len(_tickets) > MAX_TICKETS:
+        _tickets.popitem(last=False)
+
+
+def _start_writer():
+    global _writer
+    if _writer is None:
+        _writer = threading.Thread(target=_write_loop, name="ecometer-write-behind", daemon=True)
+        _writer.start()
+
+
+def _write_loop():
+    while True:
+        with _cond:
+            while not _pending:
+                _cond.wait()
+        time.sleep(COALESCE_SECONDS)
+
+        with _cond:
+            batch = list(_pending.items())
+
+        for user_id, (ticket, units, bill, bill_image_filename, eco_score) in batch:
+            try:
+                add_usage_entry(units, bill, bill_image_filename, user_id, eco_score=eco_score)
+                status = ("saved", None)
+            except Exception as e:
+                status = ("failed", str(e))
+            with _cond:
+                _set_status(ticket, status)
+                # Leave a newer submission that arrived mid-write queued
+                if _pending.get(user_id, (None,))[0] == ticket:
+                    del _pending[user_id]
+                _cond.notify_all()
+
+
+atexit.register(flush)